@@ -0,0 +1,48 @@
+"""
+Per-element cost of determining item classes for a large TMC file.
+
+Usage::
+
+    $ python benchmarks/bench_class_names.py --symbols 50000
+"""
+
+import argparse
+import tempfile
+import time
+
+import lxml.etree
+
+import synthetic
+from tcparse.parse import element_to_class_name
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--symbols', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        synthetic.generate(root, axes=1, pous=0, symbols=args.symbols,
+                           boxes=1)
+        tree = lxml.etree.parse(f'{root}/plc1/plc1.tmc')
+
+    elements = list(tree.getroot().iter(lxml.etree.Element))
+    symbols = [element for element in elements if element.tag == 'Symbol']
+    for name, items in [('all elements', elements), ('symbols', symbols)]:
+        best = min(
+            _time(element_to_class_name, items) for _ in range(args.repeat)
+        )
+        print(f'{name:<14} {len(items):>8} elements '
+              f'{1e9 * best / len(items):>8.0f} ns/element')
+
+
+def _time(func, items):
+    t0 = time.perf_counter()
+    for item in items:
+        func(item)
+    return time.perf_counter() - t0
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+"""
+Run time and peak memory usage of the command line tools.
+
+Each command is run in a fresh subprocess.  Linux only.
+
+Usage::
+
+    $ python benchmarks/bench_cli.py --symbols 50000
+"""
+
+import synthetic
+
+COMMANDS = {
+    'summary --nc': ['tcparse.summary', '--nc'],
+    'summary --links': ['tcparse.summary', '--links'],
+    'summary --plcs': ['tcparse.summary', '--plcs'],
+    'summary --symbols': ['tcparse.summary', '--symbols'],
+    'summary --all': ['tcparse.summary', '--all'],
+    'stcmd': ['tcparse.stcmd'],
+}
+
+CHILD = '''
+import contextlib, importlib, io, json, resource, sys, time
+module = importlib.import_module(sys.argv[1])
+t0 = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+    module.main(cmdline_args=sys.argv[2:])
+print(json.dumps(dict(
+    elapsed=time.perf_counter() - t0,
+    peak=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+)))
+'''
+
+
+def main():
+    args = synthetic.argument_parser(__doc__).parse_args()
+
+    with synthetic.project_from_args(args) as (fn, _):
+        print(f'{"command":<22} {"time [s]":>9} {"peak [MB]":>10}')
+        for name, (module, *options) in COMMANDS.items():
+            result = synthetic.run_child(CHILD, module, str(fn), *options)
+            print(f'{name:<22} {result["elapsed"]:>9.2f} '
+                  f'{result["peak"] / 1e6:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
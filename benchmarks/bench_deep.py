@@ -0,0 +1,57 @@
+"""
+Per-item cost of building and searching trees of increasing depth.
+
+Each tree has the same number of items, arranged as chains of nested
+elements of the given depth.
+
+Usage::
+
+    $ python benchmarks/bench_deep.py --items 20000
+"""
+
+import argparse
+import time
+
+import lxml.etree
+
+from tcparse.parse import Loader, TwincatItem
+
+
+def deep_tree(items, depth):
+    'An element with `items` descendents, nested `depth` deep'
+    root = lxml.etree.Element('Root')
+    for _ in range(max(items // depth, 1)):
+        element = root
+        for _ in range(depth):
+            element = lxml.etree.SubElement(element, 'Nested')
+    return root
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--items', type=int, default=20000)
+    parser.add_argument('--depths', type=int, nargs='+',
+                        default=[10, 100, 1000, 10000])
+    args = parser.parse_args()
+
+    print(f'{"depth":>7} {"build [us/item]":>16} {"find [us/item]":>15}')
+    for depth in args.depths:
+        root = deep_tree(args.items, depth)
+        num_items = len(root.xpath('//Nested'))
+        try:
+            t0 = time.perf_counter()
+            item = TwincatItem.parse(root, loader=Loader())
+            t1 = time.perf_counter()
+            found = sum(1 for _ in item.find(TwincatItem))
+            t2 = time.perf_counter()
+        except RecursionError:
+            print(f'{depth:>7} {"RecursionError":>16}')
+            continue
+
+        assert found == num_items
+        print(f'{depth:>7} {1e6 * (t1 - t0) / num_items:>16.2f} '
+              f'{1e6 * (t2 - t1) / num_items:>15.2f}')
+
+
+if __name__ == '__main__':
+    main()
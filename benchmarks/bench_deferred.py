@@ -0,0 +1,50 @@
+"""
+Cost of using a small part of a project, with and without deferred reading
+of the files referenced by ``File`` attributes.
+
+Each configuration is run in a fresh subprocess, which loads the project,
+counts the boxes of the first IO device, and gets the name of the first box
+by navigating the tree.  Linux only.
+
+Usage::
+
+    $ python benchmarks/bench_deferred.py --boxes 500
+"""
+
+import synthetic
+
+CONFIGURATIONS = {
+    'default': {},
+    'lazy=True': dict(lazy=True),
+    'defer_files=True': dict(defer_files=True),
+    'both': dict(lazy=True, defer_files=True),
+}
+
+# Timed along with the load
+USE = '''
+device, = project.Project[0].Io[0].TcSmItem[0].Device
+boxes = device.TcSmItem
+name = boxes[0].Box[0].name
+'''
+
+FILES_READ = '''
+result['files'] = project.loader.files_parsed
+'''
+
+
+def main():
+    args = synthetic.argument_parser(__doc__, boxes=500).parse_args()
+
+    with synthetic.project_from_args(args) as (fn, _):
+        print(f'{"configuration":<18} {"time [s]":>9} {"peak [MB]":>10} '
+              f'{"files read":>11}')
+        for name, options in CONFIGURATIONS.items():
+            result = synthetic.measure(
+                fn, dict(options, keep_elements=False), use=USE,
+                after=FILES_READ)
+            print(f'{name:<18} {result["elapsed"]:>9.2f} '
+                  f'{result["peak"] / 1e6:>10.1f} {result["files"]:>11}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+"""
+Effect of garbage collection settings on load time and on the duration of
+full garbage collections afterward.
+
+Each configuration is loaded in a fresh subprocess.  A long-running process
+periodically pays for a full collection, which traverses every tracked
+object, including the whole project unless it has been frozen.
+
+Usage::
+
+    $ python benchmarks/bench_gc.py --symbols 50000
+"""
+
+import synthetic
+
+CONFIGURATIONS = {
+    'pause_gc=False': dict(pause_gc=False),
+    'default (pause_gc)': {},
+    'freeze=True': dict(freeze=True),
+}
+
+# Shortest of several full collections, with the project still referenced
+FULL_COLLECTION = '''
+pauses = []
+for _ in range(5):
+    t0 = time.perf_counter()
+    gc.collect()
+    pauses.append(time.perf_counter() - t0)
+result['pause'] = min(pauses)
+'''
+
+
+def main():
+    args = synthetic.argument_parser(__doc__).parse_args()
+
+    with synthetic.project_from_args(args) as (fn, _):
+        print(f'{"configuration":<20} {"load [s]":>9} '
+              f'{"full collection [ms]":>21}')
+        for name, options in CONFIGURATIONS.items():
+            result = synthetic.measure(fn, options, after=FULL_COLLECTION)
+            print(f'{name:<20} {result["elapsed"]:>9.2f} '
+                  f'{1e3 * result["pause"]:>21.1f}')
+
+
+if __name__ == '__main__':
+    main()
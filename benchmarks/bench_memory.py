@@ -0,0 +1,40 @@
+"""
+Memory usage of load_project with different options.
+
+Each configuration is loaded in a fresh subprocess, reporting the resident
+memory retained after loading (with the project still referenced) and the
+peak resident memory during the load.  Linux only.
+
+Usage::
+
+    $ python benchmarks/bench_memory.py --symbols 50000
+"""
+
+import synthetic
+
+CONFIGURATIONS = {
+    'default': {},
+    'intern_strings=False': dict(intern_strings=False),
+    'keep_elements=False': dict(keep_elements=False),
+    'streaming=True': dict(streaming=True),
+    'compact_leaves=True': dict(compact_leaves=True),
+    'all of the above': dict(keep_elements=False, streaming=True,
+                             compact_leaves=True),
+}
+
+
+def main():
+    args = synthetic.argument_parser(__doc__).parse_args()
+
+    with synthetic.project_from_args(args) as (fn, _):
+        print(f'{"configuration":<22} {"time [s]":>9} {"retained [MB]":>14} '
+              f'{"peak [MB]":>10}')
+        for name, options in CONFIGURATIONS.items():
+            result = synthetic.measure(fn, options)
+            print(f'{name:<22} {result["elapsed"]:>9.2f} '
+                  f'{result["retained"] / 1e6:>14.1f} '
+                  f'{result["peak"] / 1e6:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
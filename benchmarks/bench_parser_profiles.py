@@ -0,0 +1,30 @@
+"""
+Load time and memory usage of load_project for each XML parser profile.
+
+Usage::
+
+    $ python benchmarks/bench_parser_profiles.py --symbols 50000
+"""
+
+import synthetic
+from tcparse.parse import PARSER_PROFILES
+
+
+def main():
+    args = synthetic.argument_parser(__doc__).parse_args()
+
+    with synthetic.project_from_args(args) as (fn, _):
+        print(f'{"profile":<10} {"streaming":<10} {"time [s]":>9} '
+              f'{"retained [MB]":>14} {"peak [MB]":>10}')
+        for profile in PARSER_PROFILES:
+            for streaming in (False, True):
+                result = synthetic.measure(fn, dict(parser_profile=profile,
+                                                    streaming=streaming))
+                print(f'{profile:<10} {str(streaming):<10} '
+                      f'{result["elapsed"]:>9.2f} '
+                      f'{result["retained"] / 1e6:>14.1f} '
+                      f'{result["peak"] / 1e6:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
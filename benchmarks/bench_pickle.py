@@ -0,0 +1,67 @@
+"""
+Time to save a loaded project with pickle and load it again, compared with
+loading it from the XML and from a warm parse cache.
+
+Usage::
+
+    $ python benchmarks/bench_pickle.py --symbols 50000
+"""
+
+import gc
+import os
+import pickle
+import time
+
+import synthetic
+import tcparse
+
+OPTIONS = dict(keep_elements=False, compact_leaves=True, symbol_classes=False,
+               parser_profile='compact')
+
+
+def timed(func, *args, **kwargs):
+    'Call `func`, returning its result and the elapsed time'
+    t0 = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - t0
+
+
+def main():
+    args = synthetic.argument_parser(__doc__).parse_args()
+
+    with synthetic.project_from_args(args) as (fn, root):
+        cache_dir = os.path.join(root, 'cache')
+        pickle_fn = os.path.join(root, 'project.pickle')
+
+        project, load = timed(tcparse.load_project, fn, **OPTIONS)
+        tcparse.load_project(fn, cache_dir=cache_dir, **OPTIONS)
+        _, cached = timed(tcparse.load_project, fn, cache_dir=cache_dir,
+                          **OPTIONS)
+
+        def dump():
+            with open(pickle_fn, 'wb') as f:
+                pickle.dump(project, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+        def load_pickle():
+            with open(pickle_fn, 'rb') as f:
+                # As with load_project, the collector would repeatedly scan
+                # the growing model
+                gc.disable()
+                try:
+                    return pickle.load(f)
+                finally:
+                    gc.enable()
+
+        _, dumped = timed(dump)
+        _, loaded = timed(load_pickle)
+
+        size = os.path.getsize(pickle_fn)
+        print(f'{"load_project":<26} {load:>7.2f} s')
+        print(f'{"load_project (warm cache)":<26} {cached:>7.2f} s')
+        print(f'{"pickle.dump":<26} {dumped:>7.2f} s '
+              f'({size / 1e6:.1f} MB)')
+        print(f'{"pickle.load":<26} {loaded:>7.2f} s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,407 @@
+"""
+Generate synthetic TwinCAT projects of a given size for benchmarking, along
+with the harness shared by the benchmarks.
+
+Usage::
+
+    $ python benchmarks/synthetic.py /tmp/synthetic --axes 200 --symbols 50000
+"""
+
+import argparse
+import contextlib
+import json
+import pathlib
+import subprocess
+import sys
+import tempfile
+
+XSI = 'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance"'
+VERSION = 'TcSmVersion="1.0" TcVersion="3.1.4022.27"'
+
+
+def _write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+
+
+def generate(root, *, name='synthetic', axes=10, pous=10, symbols=1000,
+             boxes=10):
+    '''
+    Write a synthetic project to `root`
+
+    Parameters
+    ----------
+    root : str or pathlib.Path
+        Destination directory
+    name : str, optional
+        The project name
+    axes : int, optional
+        Number of NC axes, each with a linked FB_MotionStage in MAIN
+    pous : int, optional
+        Number of additional POUs
+    symbols : int, optional
+        Number of additional TMC symbols (and one data type per 10 symbols)
+    boxes : int, optional
+        Number of EtherCAT boxes, chained one inside the other in groups of
+        ten
+
+    Returns
+    -------
+    tsproj : pathlib.Path
+        The tsproj filename
+    '''
+    root = pathlib.Path(root)
+    tsproj = root / f'{name}.tsproj'
+    _write(tsproj, f'''<?xml version="1.0"?>
+<TcSmProject {XSI} {VERSION}>
+  <Project ProjectGUID="{{00000000-0000-0000-0000-000000000000}}" \
+TargetNetId="5.1.2.3.1.1">
+    <System>
+      <Tasks>
+        <Task Id="3" Priority="20" CycleTime="100000">
+          <Name>PlcTask</Name>
+        </Task>
+      </Tasks>
+    </System>
+    <Motion>
+      <NC File="NC.xti"/>
+    </Motion>
+    <Plc>
+      <Project File="plc1.xti"/>
+    </Plc>
+    <Io>
+      <Device File="Device 1 (EtherCAT).xti" Id="1"/>
+    </Io>
+  </Project>
+</TcSmProject>
+''')
+
+    nc_axes = '\n'.join(f'    <Axis File="Axis {i}.xti" Id="{i}"/>'
+                        for i in range(1, axes + 1))
+    _write(root / '_Config' / 'NC' / 'NC.xti', f'''<?xml version="1.0"?>
+<TcSmItem {XSI} {VERSION} ClassName="CNcSafTaskDef">
+  <NC>
+    <SafTask Priority="4" CycleTime="20000">
+      <Name>NC-Task 1 SAF</Name>
+    </SafTask>
+{nc_axes}
+  </NC>
+</TcSmItem>
+''')
+
+    for i in range(1, axes + 1):
+        _write(root / '_Config' / 'NC' / 'Axes' / f'Axis {i}.xti',
+               f'''<?xml version="1.0"?>
+<TcSmItem {XSI} {VERSION} ClassName="CNcAxisDef">
+  <Axis Name="Axis {i}" Id="{i}" AxisType="1">
+    <AxisPara>
+      <General UnitName="mm"/>
+      <Dynamic Acc="100" Dec="100" Jerk="1000"/>
+      <Limits RefVeloMax="5" PosLagMax="0.5"/>
+    </AxisPara>
+    <Encoder Name="Enc" EncType="1">
+      <EncPara>
+        <General ScaleFactorNumerator="0.0001" ScaleFactorDenominator="1"/>
+      </EncPara>
+    </Encoder>
+    <Drive Name="Drive" DriveType="1"/>
+  </Axis>
+</TcSmItem>
+''')
+
+    links = '\n'.join(
+        f'''      <OwnerB Name="TINC^NC-Task 1 SAF^Axes^Axis {i}">
+        <Link VarA="PlcTask Outputs^MAIN.M{i}.Axis.PlcToNc" \
+VarB="In^PlcToNc"/>
+        <Link VarA="PlcTask Inputs^MAIN.M{i}.Axis.NcToPlc" \
+VarB="Out^NcToPlc"/>
+      </OwnerB>'''
+        for i in range(1, axes + 1))
+    _write(root / '_Config' / 'PLC' / 'plc1.xti', f'''<?xml version="1.0"?>
+<TcSmItem {XSI} {VERSION} ClassName="CNestedPlcProjDef">
+  <Project GUID="{{00000000-0000-0000-0000-000000000001}}" Name="plc1" \
+PrjFilePath="..\\..\\plc1\\plc1.plcproj" \
+TmcFilePath="..\\..\\plc1\\plc1.tmc">
+    <Instance Id="#x08502000" TcSmClass="TComPlcObjDef">
+      <Name>plc1 Instance</Name>
+    </Instance>
+  </Project>
+  <Mappings>
+    <OwnerA Name="TIPC^plc1^plc1 Instance">
+{links}
+    </OwnerA>
+  </Mappings>
+</TcSmItem>
+''')
+
+    boxes_per_chain = 10
+    device_boxes = []
+    for chain in range(0, boxes, boxes_per_chain):
+        directory = root / '_Config' / 'IO' / 'Device 1 (EtherCAT)'
+        box_ids = range(chain + 1, min(chain + boxes_per_chain, boxes) + 1)
+        device_boxes.append(
+            f'    <Box File="Term {box_ids[0]}.xti" Id="{box_ids[0]}"/>')
+        for box_id in box_ids:
+            child = (f'    <Box File="Term {box_id + 1}.xti" '
+                     f'Id="{box_id + 1}"/>'
+                     if box_id + 1 in box_ids else '')
+            _write(directory / f'Term {box_id}.xti', f'''<?xml version="1.0"?>
+<TcSmItem {XSI} {VERSION} ClassName="CDevEtherCatBoxDef">
+  <Box Id="{box_id}" BoxType="9099">
+    <Name>__FILENAME__</Name>
+    <EtherCAT SlaveType="2" VendorId="#x00000002" ProductCode="#x03ec3052"/>
+    <Pdo Name="Channel 1" Index="#x1a00" Flags="#x0011" SyncMan="0">
+      <Entry Name="Input" Index="#x6000" Sub="#x01">
+        <Type>BOOL</Type>
+      </Entry>
+    </Pdo>
+{child}
+  </Box>
+</TcSmItem>
+''')
+            directory = directory / f'Term {box_id}'
+
+    device_boxes = '\n'.join(device_boxes)
+    _write(root / '_Config' / 'IO' / 'Device 1 (EtherCAT).xti',
+           f'''<?xml version="1.0"?>
+<TcSmItem {XSI} {VERSION} ClassName="CDevEtherCatDef" SubType="111">
+  <Device Id="1" DevType="111" RemoteName="Device 1 (EtherCAT)">
+    <Name>__FILENAME__</Name>
+{device_boxes}
+  </Device>
+</TcSmItem>
+''')
+
+    source = {'POUs\\MAIN.TcPOU': _pou(
+        'MAIN',
+        [f'M{i} : ST_MotionStage;' for i in range(1, axes + 1)] +
+        [f'fbM{i} : FB_MotionStage;' for i in range(1, axes + 1)],
+        [f'fbM{i}(stMotionStage := M{i});' for i in range(1, axes + 1)],
+    )}
+    for i in range(pous):
+        source[f'POUs\\PRG_{i}.TcPOU'] = _pou(
+            f'PRG_{i}',
+            [f'nValue{j} : INT;' for j in range(20)],
+            [f'nValue{j} := nValue{j} + {j};' for j in range(20)],
+        )
+
+    compiles = '\n'.join(f'    <Compile Include="{fn}"/>' for fn in source)
+    _write(root / 'plc1' / 'plc1.plcproj', f'''<?xml version="1.0"?>
+<Project DefaultTargets="Build" \
+xmlns="http://schemas.microsoft.com/developer/msbuild/2003">
+  <PropertyGroup>
+    <Name>plc1</Name>
+  </PropertyGroup>
+  <ItemGroup>
+{compiles}
+  </ItemGroup>
+</Project>
+''')
+    for fn, text in source.items():
+        _write(root / 'plc1' / pathlib.PureWindowsPath(fn), text)
+
+    _write(root / 'plc1' / 'plc1.tmc', _tmc(axes, symbols))
+    return tsproj
+
+
+# Run by `measure` in a fresh subprocess, with the statements to time after
+# loading in {use} and any further measurements to add to `result` in {after}
+LOAD_CHILD = '''
+import gc, json, os, resource, sys, time
+import tcparse
+
+def rss():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+fn, options = sys.argv[1], json.loads(sys.argv[2])
+before = rss()
+t0 = time.perf_counter()
+project = tcparse.load_project(fn, **options)
+{use}
+result = dict(elapsed=time.perf_counter() - t0)
+{after}
+gc.collect()
+result.update(
+    retained=rss() - before,
+    peak=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+)
+print(json.dumps(result))
+'''
+
+
+def run_child(script, *args):
+    '''
+    Run `script` in a fresh subprocess, returning the JSON it prints
+
+    Parameters
+    ----------
+    script : str
+        Python source, run with ``python -c``
+    *args : str
+        Command line arguments, available as ``sys.argv[1:]``
+    '''
+    output = subprocess.check_output([sys.executable, '-c', script, *args])
+    return json.loads(output)
+
+
+def measure(fn, options, *, use='', after=''):
+    '''
+    Load `fn` in a subprocess and return its measurements (Linux only)
+
+    Parameters
+    ----------
+    fn : str or pathlib.Path
+        The tsproj filename
+    options : dict
+        Keyword arguments for `tcparse.load_project`
+    use : str, optional
+        Statements using ``project``, timed along with the load
+    after : str, optional
+        Statements adding further measurements to ``result``
+
+    Returns
+    -------
+    result : dict
+        With at least ``elapsed`` (seconds), and ``retained`` and ``peak``
+        resident memory (bytes)
+    '''
+    script = LOAD_CHILD.format(use=use, after=after)
+    return run_child(script, str(fn), json.dumps(options))
+
+
+def argument_parser(description, *, boxes=100):
+    '''
+    An argument parser with the options to load an existing project or size
+    a synthetic one (see `project_from_args`)
+    '''
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--project', type=str,
+                        help='Existing tsproj to load, instead of generating '
+                        'a synthetic one')
+    parser.add_argument('--axes', type=int, default=100)
+    parser.add_argument('--symbols', type=int, default=20000)
+    parser.add_argument('--boxes', type=int, default=boxes)
+    return parser
+
+
+@contextlib.contextmanager
+def project_from_args(args):
+    '''
+    Generate the project requested by the `argument_parser` options in a
+    temporary directory, unless an existing one was given
+
+    Yields
+    ------
+    fn : str or pathlib.Path
+        The tsproj filename
+    root : str
+        The temporary directory, removed afterward
+    '''
+    with tempfile.TemporaryDirectory() as root:
+        fn = args.project or generate(
+            root, axes=args.axes, symbols=args.symbols, boxes=args.boxes)
+        yield fn, root
+
+
+def _pou(name, variables, implementation):
+    variables = '\n'.join(f'    {var}' for var in variables)
+    implementation = '\n'.join(implementation)
+    return f'''<?xml version="1.0" encoding="utf-8"?>
+<TcPlcObject Version="1.1.0.1" ProductVersion="3.1.4022.27">
+  <POU Name="{name}" Id="{{00000000-0000-0000-0000-000000000002}}">
+    <Declaration><![CDATA[PROGRAM {name}
+VAR
+{variables}
+END_VAR
+]]></Declaration>
+    <Implementation>
+      <ST><![CDATA[{implementation}
+]]></ST>
+    </Implementation>
+  </POU>
+</TcPlcObject>
+'''
+
+
+def _symbol(name, base_type, bit_offs, properties=''):
+    return f'''          <Symbol>
+            <Name>{name}</Name>
+            <BitSize>16</BitSize>
+            <BaseType>{base_type}</BaseType>{properties}
+            <BitOffs>{bit_offs}</BitOffs>
+          </Symbol>
+'''
+
+
+def _tmc(axes, symbols):
+    data_types = ''.join(
+        f'''    <DataType>
+      <Name>ST_Type{i}</Name>
+      <BitSize>64</BitSize>
+      <SubItem>
+        <Name>fValue</Name>
+        <Type>LREAL</Type>
+        <BitSize>64</BitSize>
+        <BitOffs>0</BitOffs>
+      </SubItem>
+    </DataType>
+'''
+        for i in range(symbols // 10))
+
+    base_types = ['BOOL', 'INT', 'LREAL', 'UDINT']
+    motors = ''.join(
+        _symbol(f'MAIN.fbM{i}', 'FB_MotionStage', i * 16, f'''
+            <Properties>
+              <Property>
+                <Name>pytmc</Name>
+                <Value>pv: TST:MMS:{i:02d}</Value>
+              </Property>
+            </Properties>''')
+        for i in range(1, axes + 1))
+    others = ''.join(
+        _symbol(f'GVL.nValue{i}',
+                (f'ST_Type{i // 10}' if i % 5 == 0
+                 else base_types[i % len(base_types)]),
+                (axes + i) * 16)
+        for i in range(symbols))
+
+    return f'''<?xml version="1.0"?>
+<TcModuleClass {XSI}>
+  <DataTypes>
+{data_types}  </DataTypes>
+  <Modules>
+    <Module GUID="{{00000000-0000-0000-0000-000000000003}}">
+      <Name>plc1</Name>
+      <DataAreas>
+        <DataArea>
+          <Name>PlcTask Internal</Name>
+{motors}{others}        </DataArea>
+      </DataAreas>
+      <Properties>
+        <Property>
+          <Name>ApplicationName</Name>
+          <Value>Port_851</Value>
+        </Property>
+      </Properties>
+    </Module>
+  </Modules>
+</TcModuleClass>
+'''
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('root', type=str, help='Destination directory')
+    parser.add_argument('--name', type=str, default='synthetic')
+    parser.add_argument('--axes', type=int, default=10)
+    parser.add_argument('--pous', type=int, default=10)
+    parser.add_argument('--symbols', type=int, default=1000)
+    parser.add_argument('--boxes', type=int, default=10)
+    args = parser.parse_args()
+    print(generate(args.root, name=args.name, axes=args.axes, pous=args.pous,
+                   symbols=args.symbols, boxes=args.boxes))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""
+An on-disk cache for parsed TwinCAT project files.
+
+Entries are keyed on the file path, tcparse version, and any parse options.
+An entry is considered valid when the size and modification time of the file
+match those recorded; if they do not, the content hash is compared before the
+entry is discarded.
+"""
+
+import hashlib
+import logging
+import os
+import pathlib
+import pickle
+import tempfile
+
+from ._version import get_versions
+
+logger = logging.getLogger(__name__)
+
+# Bump this when the format of cached entries changes
+CACHE_FORMAT = 2
+
+
+def default_cache_dir():
+    '''
+    The default cache directory: ``$XDG_CACHE_HOME/tcparse``, falling back to
+    ``~/.cache/tcparse``
+    '''
+    base = os.environ.get('XDG_CACHE_HOME')
+    if not base:
+        base = pathlib.Path.home() / '.cache'
+    return pathlib.Path(base) / 'tcparse'
+
+
+def hash_file(fn):
+    'SHA-256 hex digest of the contents of a file'
+    digest = hashlib.sha256()
+    with open(fn, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ParseCache:
+    '''
+    A directory of cached, parsed files
+
+    Parameters
+    ----------
+    cache_dir : str or pathlib.Path
+        The cache directory, created on demand
+    key : tuple, optional
+        Parse options which affect the cached contents
+    '''
+
+    def __init__(self, cache_dir, key=()):
+        self.cache_dir = pathlib.Path(cache_dir).expanduser()
+        self.key = key
+        self.version = get_versions()['version']
+        self.hits = 0
+        self.misses = 0
+
+    def entry_path(self, fn):
+        'The cache entry filename for a given source file'
+        key = repr((CACHE_FORMAT, self.version, self.key,
+                    str(pathlib.Path(fn).absolute())))
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return self.cache_dir / f'{digest}.pickle'
+
+    def load(self, fn):
+        '''
+        Load a cached entry for the given file
+
+        Returns
+        -------
+        entry : object or None
+            None if there is no valid entry
+        '''
+        entry_path = self.entry_path(fn)
+        sha256 = None
+        try:
+            with open(entry_path, 'rb') as f:
+                header = pickle.load(f)
+                st = os.stat(fn)
+                stat = (st.st_size, st.st_mtime_ns)
+                if (header['size'], header['mtime_ns']) != stat:
+                    sha256 = hash_file(fn)
+                    if sha256 != header['sha256']:
+                        self.misses += 1
+                        return None
+                entry = pickle.load(f)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except Exception as ex:
+            logger.debug('Ignoring invalid cache entry %s for %s: %s',
+                         entry_path, fn, ex)
+            self.misses += 1
+            return None
+
+        if sha256 is not None:
+            # Contents unchanged; only the timestamp differs
+            self.store(fn, entry, sha256=sha256)
+
+        self.hits += 1
+        return entry
+
+    def store(self, fn, entry, *, sha256=None):
+        'Store an entry for the given file'
+        try:
+            self._write(fn, entry, sha256=sha256)
+        except Exception as ex:
+            logger.warning('Unable to cache %s in %s: %s', fn,
+                           self.cache_dir, ex)
+
+    def _write(self, fn, entry, *, sha256=None):
+        st = os.stat(fn)
+        header = dict(size=st.st_size, mtime_ns=st.st_mtime_ns,
+                      sha256=sha256 or hash_file(fn))
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        entry_path = self.entry_path(fn)
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(header, f, protocol=pickle.HIGHEST_PROTOCOL)
+                pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, entry_path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
@@ -1,4 +1,10 @@
+import array
+import bisect
 import collections
+import concurrent.futures
+import contextlib
+import functools
+import gc
 import logging
 import os
 import pathlib
@@ -8,12 +14,30 @@ import types
 import lxml
 import lxml.etree
 
+from .cache import ParseCache
 
 TWINCAT_TYPES = {}
 USE_FILE_AS_PATH = object()
+# Shared by all items without children or comments
+_EMPTY = ()
 
 logger = logging.getLogger(__name__)
 
+# Keyword arguments for lxml.etree.XMLParser, by profile name
+PARSER_PROFILES = {
+    # lxml defaults: keep comments and whitespace-only text
+    'default': {},
+    # Do not resolve entities or access the network
+    'safe': dict(resolve_entities=False, no_network=True),
+    # Also drop comments and whitespace-only text
+    'compact': dict(resolve_entities=False, no_network=True,
+                    remove_blank_text=True, remove_comments=True),
+    # Also lift lxml's limits on document size and depth
+    'huge': dict(resolve_entities=False, no_network=True,
+                 remove_blank_text=True, remove_comments=True,
+                 huge_tree=True),
+}
+
 
 def _register_type(cls):
     'Decorator to register a TwincatItem-based class'
@@ -53,13 +77,19 @@ def separate_children_by_tag(children):
     return d
 
 
+@functools.lru_cache(maxsize=None)
 def strip_namespace(tag):
     '''
     Strip off {{namespace}} from: {{namespace}}tag
+
+    Cached, as there are only a handful of distinct tags.
     '''
     return lxml.etree.QName(tag).localname
 
 
+_base_type_xpath = lxml.etree.XPath('BaseType')
+
+
 def element_to_class_name(element):
     '''
     Determine the Python class name for an element
@@ -78,15 +108,837 @@ def element_to_class_name(element):
     if tag == 'TcSmItem':
         return f'{tag}_' + element.attrib['ClassName'], TcSmItem
     if tag == 'Symbol':
-        base_type, = element.xpath('BaseType')
+        base_type, = _base_type_xpath(element)
         return f'{tag}_' + base_type.text, Symbol
     return tag, TwincatItem
 
 
+def get_class(classname, base):
+    '''
+    Get a registered TwincatItem class by name, creating and registering a new
+    subclass of `base` if necessary
+
+    Parameters
+    ----------
+    classname : str
+    base : class
+
+    Returns
+    -------
+    cls : class
+    '''
+    try:
+        return TWINCAT_TYPES[classname]
+    except KeyError:
+        # Dynamically create and register new TwincatItem-based types!
+        return _register_type(type(classname, (base, ),
+                                   {'__slots__': (), '_generated': True}))
+
+
+def _get_item_class(classname, base, loader):
+    '''
+    `get_class`, unless the loader does not want a generated class for each
+    Symbol base type (see `Loader.symbol_classes`)
+    '''
+    if base is Symbol and not getattr(loader, 'symbol_classes', True):
+        cls = TWINCAT_TYPES.get(classname)
+        return cls if cls is not None and not cls._generated else Symbol
+    return get_class(classname, base)
+
+
+def symbols_by_type(symbols):
+    '''
+    Group symbols by base type
+
+    Parameters
+    ----------
+    symbols : iterable of Symbol
+
+    Returns
+    -------
+    dict
+        Base type (e.g., ``'FB_MotionStage'``) to list of `Symbol`
+    '''
+    by_type = collections.defaultdict(list)
+    for symbol in symbols:
+        by_type[symbol.base_type].append(symbol)
+    return dict(by_type)
+
+
+# Cache of classes to (number of registered types, tags) for _may_contain
+_tags_by_class = {}
+_has_file_reference = lxml.etree.XPath('boolean(.//*[@File])')
+
+
+def _element_class(element):
+    '''
+    The registered class for an element, without creating one (see
+    `get_class`)
+    '''
+    classname, base = element_to_class_name(element)
+    return TWINCAT_TYPES.get(classname, base)
+
+
+def _may_contain(element, cls, *, include_self=False, files=True):
+    '''
+    Determine whether the items built from the descendents of `element` may
+    include instances of `cls`
+
+    Elements with a ``File`` attribute may include anything, as may those of
+    classes which load further files themselves (e.g., `Plc`).
+
+    Parameters
+    ----------
+    element : lxml.etree.Element
+    cls : class or tuple of classes
+    include_self : bool, optional
+        Consider `element` itself as well
+    files : bool, optional
+        Consider ``File`` attributes.  If disabled, the referenced files are
+        assumed to be checked separately.
+
+    Returns
+    -------
+    bool
+    '''
+    classes = cls if isinstance(cls, tuple) else (cls, )
+    if any(not isinstance(cls, type) or not issubclass(cls, TwincatItem) or
+           cls is TwincatItem for cls in classes):
+        # Generated classes may be created for any tag
+        return True
+
+    num_types, tags = _tags_by_class.get(cls, (None, None))
+    if num_types != len(TWINCAT_TYPES):
+        tags = set()
+        for item_cls in TWINCAT_TYPES.values():
+            if issubclass(item_cls, classes) or item_cls._loads_files:
+                # See element_to_class_name
+                for base in (Symbol, TcSmItem):
+                    if issubclass(item_cls, base):
+                        tags.add(base.__name__)
+                        break
+                else:
+                    tags.add(item_cls.__name__)
+        tags = tuple(f'{{*}}{tag}' for tag in sorted(tags))
+        _tags_by_class[cls] = (len(TWINCAT_TYPES), tags)
+
+    if tags:
+        candidates = (element.iter(*tags) if include_self
+                      else element.iterdescendants(*tags))
+        for candidate in candidates:
+            item_cls = _element_class(candidate)
+            if issubclass(item_cls, classes) or item_cls._loads_files:
+                return True
+    return files and _has_file_reference(element)
+
+
+def _discover_files(element, project_filename, filename):
+    '''
+    Find all files referenced by ``File`` attributes in an XML element
+
+    Yields
+    ------
+    path : pathlib.Path
+        The full path to the referenced file
+    project_filename : pathlib.Path
+        The file containing the nearest `Project` above the referenced item
+    '''
+    def context(element, project_filename):
+        if strip_namespace(element.tag) == 'Project':
+            child_project_filename = filename
+        else:
+            child_project_filename = project_filename
+        return (element.iterchildren(tag=lxml.etree.Element),
+                project_filename, child_project_filename)
+
+    # Depth-first with an explicit stack, as in `TwincatItem.walk`
+    stack = [context(element, project_filename)]
+    while stack:
+        children, project_filename, child_project_filename = stack[-1]
+        for child in children:
+            if 'File' not in child.attrib:
+                stack.append(context(child, child_project_filename))
+                break
+
+            cls = get_class(*element_to_class_name(child))
+            if (cls._load_path is not USE_FILE_AS_PATH and
+                    not project_filename):
+                continue
+
+            path = cls.get_file_path(child.attrib['File'],
+                                     parent_filename=filename,
+                                     project_filename=project_filename)
+            yield path, child_project_filename
+        else:
+            stack.pop()
+
+
+def _discover_cached_files(entry, project_filename, filename):
+    '''
+    Find all files referenced in a cache entry from `TwincatItem.to_cache`
+
+    Yields
+    ------
+    path : pathlib.Path
+        The full path to the referenced file
+    project_filename : pathlib.Path
+        The file containing the nearest `Project` above the referenced item
+    '''
+    # [project_filename, number of records remaining] for each item whose
+    # children are still to come, starting with one for the entry itself
+    stack = [[project_filename, 1]]
+    for record in entry:
+        context = stack[-1]
+        context[1] -= 1
+        if len(record) == 2:
+            if record[0] is None:
+                yield pathlib.Path(record[1]), context[0]
+            # Otherwise, a (tag, text) leaf from TwincatLeaf.to_cache
+        elif record[-1]:
+            stack.append([filename if record[0] == 'Project' else context[0],
+                          record[-1]])
+        while stack and not stack[-1][1]:
+            stack.pop()
+
+
+class Loader:
+    '''
+    Options and state shared by all files parsed during a single load
+
+    Each physical file is parsed at most once per loader; further requests
+    for the same file return the item that was already built.
+
+    Parameters
+    ----------
+    cache_dir : str or pathlib.Path, optional
+        Directory for the on-disk parse cache, such that only files which
+        have changed since they were last cached are parsed again.  If unset,
+        every file is parsed from scratch.
+    jobs : int, optional
+        Number of threads used to read and parse XML in `parse_many` (e.g.,
+        the PLC source files) and `prefetch`.  Defaults to 1, i.e., serial
+        parsing.
+    streaming : bool, optional
+        Build items incrementally with `TwincatItem.iterparse`, discarding
+        the XML as it is read.  Reduces peak memory for very large files
+        (e.g., TMC), but files are then not read ahead of time by
+        `parse_many` or `prefetch`.
+    keep_elements : bool, optional
+        Keep a reference to the source `lxml.etree.Element` on each item as
+        `TwincatItem.element`.  With this disabled, items are detached from
+        the XML as they are built, and each file's tree is freed as soon as
+        its items exist.  Nothing in tcparse itself requires the element;
+        only user code inspecting `TwincatItem.element` directly (e.g., with
+        ``item.element.xpath(...)``) does.  Items loaded from the cache or
+        by streaming never have an element.
+    compact_leaves : bool, optional
+        Represent text-only elements, those without attributes or children
+        and without a customized class (e.g., ``<BitSize>16</BitSize>``), as
+        `TwincatLeaf` rather than `TwincatItem`.
+    symbol_classes : bool, optional
+        Create a `Symbol` subclass for each base type, e.g., ``Symbol_INT``.
+        If disabled, symbols share the `Symbol` class unless a customized
+        subclass is registered for their base type (e.g.,
+        `Symbol_FB_MotionStage`), avoiding thousands of classes for large TMC
+        files.  Either way, use `Symbol.base_type` or `symbols_by_type` to
+        categorize symbols.
+    lazy : bool, optional
+        Add the children of each item only on first access of `children`,
+        `children_by_tag`, a child tag attribute, or `find`, at which point
+        its XML element is processed.  The XML is therefore kept until then.
+        `find` skips items whose XML cannot contain the class searched for.
+        Items are always built fully when streaming, or loading from or
+        saving to the cache.
+    intern_strings : bool, optional
+        Share a single copy of each distinct tag, attribute name, and short
+        attribute value or text among all items (see `intern`), as these are
+        heavily repeated.  Enabled by default.
+    parser_profile : str or dict, optional
+        The name of a profile in `PARSER_PROFILES`, or keyword arguments for
+        `lxml.etree.XMLParser`.  Files are always read as bytes, leaving the
+        decoding to lxml.
+    defer_files : bool, optional
+        Read files referenced by ``File`` attributes (e.g., XTI files for IO
+        devices, boxes, and axes), as well as the PLC project and TMC files
+        loaded by `Plc`, only on first access of the children of their
+        top-level item.  Until then, the item is built from the opening tag
+        of the file alone, such that its class, tag, and attributes are
+        available.  Not applied when streaming, or loading from or saving to
+        the cache.
+    include : sequence of classes, optional
+        Build only what is required for instances of these classes: their
+        subtrees in full, the items leading up to them, and the children that
+        those items require (see `TwincatItem._required_children`).  Elements
+        whose subtree cannot contain any, including entire files referenced
+        by ``File`` attributes, are skipped.  `find` and other queries then
+        only see that part of the project.  For example, ``[NC]`` builds
+        only the NC axes.  Ignored when streaming, which always builds (and
+        caches) the full project.
+    exclude : sequence of classes, optional
+        Skip the subtrees of instances of these classes (e.g., ``[Box]``),
+        including entire files referenced by ``File`` attributes.  Ignored
+        when streaming, as is `include`.
+
+    Attributes
+    ----------
+    intern_max_length : int
+        Longer strings are not interned
+    items_by_path : dict
+        Resolved file path to the top-level `TwincatItem` built from it
+    files_parsed : int
+        Number of files built, either from XML or from the cache
+    files_deferred : int
+        Number of files whose reading was deferred by `defer_files`
+    duplicates_avoided : int
+        Number of requests satisfied by `items_by_path`
+    files_prefetched : int
+        Number of files read ahead of time by `prefetch`
+    paths : PathResolver
+        Case-insensitive path lookup, with directory listings cached for the
+        duration of the load
+    '''
+
+    def __init__(self, *, cache_dir=None, jobs=1, streaming=False,
+                 keep_elements=True, compact_leaves=False,
+                 symbol_classes=True, lazy=False, intern_strings=True,
+                 parser_profile='default', defer_files=False, include=None,
+                 exclude=None):
+        if isinstance(parser_profile, str):
+            parser_profile = PARSER_PROFILES[parser_profile]
+        self.parser_options = dict(parser_profile)
+
+        # Options which change the cached items are part of the cache key
+        key = ()
+        if compact_leaves:
+            key += ('compact_leaves', )
+        if not symbol_classes:
+            key += ('no_symbol_classes', )
+        if self.parser_options:
+            key += (('parser', tuple(sorted(self.parser_options.items()))), )
+        self.include = tuple(include) if include is not None else None
+        self.exclude = tuple(exclude) if exclude else None
+        for option in ('include', 'exclude'):
+            classes = getattr(self, option)
+            if classes is not None and not streaming:
+                key += ((option, tuple(sorted(cls.__name__
+                                              for cls in classes))), )
+        self.cache = (ParseCache(cache_dir, key=key) if cache_dir is not None
+                      else None)
+        self.jobs = max(int(jobs or 1), 1)
+        self.streaming = streaming
+        self.keep_elements = keep_elements
+        self.compact_leaves = compact_leaves
+        self.symbol_classes = symbol_classes
+        self.lazy = lazy and cache_dir is None
+        self.defer_files = defer_files and cache_dir is None and not streaming
+        self.intern_strings = intern_strings
+        self.intern_max_length = 64
+        self.paths = PathResolver()
+        self.items_by_path = {}
+        self.files_parsed = 0
+        self.files_deferred = 0
+        self.duplicates_avoided = 0
+        self.files_prefetched = 0
+        self._prefetched = {}
+        self._strings = {}
+        self._file_may_include = {}
+        self._deferred = set()
+        # (deferred file, class) pairs which `TwincatItem.find` has found
+        # cannot match
+        self._misses = set()
+        self._uncacheable = set()
+
+    def intern(self, string):
+        '''
+        A shared copy of `string`, if `intern_strings` is enabled and it is
+        no longer than `intern_max_length`
+
+        Unlike `sys.intern`, the strings are only kept for as long as the
+        loader is.
+        '''
+        if (not self.intern_strings or string is None or
+                len(string) > self.intern_max_length):
+            return string
+        return self._strings.setdefault(string, string)
+
+    def parse(self, fn, *, parent=None):
+        '''
+        Parse a given tsproj, xti, or tmc file, using the cache if available.
+
+        With `defer_files`, files with a parent are only read once their
+        children are needed.
+
+        Returns
+        -------
+        item : TwincatItem
+        '''
+        fn = self.paths.resolve(fn)
+        item = self._get_loaded(fn)
+        if item is None and self.defer_files and parent is not None:
+            item = self._defer(fn, parent=parent)
+        elif item is None:
+            item = self._build(fn, *self._read(fn), parent=parent)
+        return item
+
+    def parse_many(self, filenames, *, parent=None):
+        '''
+        Parse several files with the same parent
+
+        With more than one job, the files are read and their XML parsed in a
+        thread pool.  Items are always built on the calling thread, in the
+        order given.
+
+        Returns
+        -------
+        items : list of TwincatItem
+        '''
+        filenames = [self.paths.resolve(fn) for fn in filenames]
+        to_read = list(dict.fromkeys(
+            fn for fn in filenames
+            if fn.resolve() not in self.items_by_path
+        ))
+
+        contents = {}
+        if self.jobs > 1 and len(to_read) > 1:
+            with concurrent.futures.ThreadPoolExecutor(self.jobs) as pool:
+                contents = dict(zip(to_read, pool.map(self._read, to_read)))
+
+        items = []
+        for fn in filenames:
+            item = self._get_loaded(fn)
+            if item is None:
+                content = contents.pop(fn, None) or self._read(fn)
+                item = self._build(fn, *content, parent=parent)
+            items.append(item)
+        return items
+
+    def prefetch(self, fn):
+        '''
+        Read `fn` and every file it references by way of ``File`` attributes,
+        recursively, without building any items
+
+        Files are read concurrently as they are discovered, using `jobs`
+        threads.  The results are kept until the files are parsed by this
+        loader.
+
+        Parameters
+        ----------
+        fn : str or pathlib.Path
+            The top-level filename, typically a tsproj
+        '''
+        def read(fn, project_filename):
+            fn = self.paths.resolve(fn)
+            return (fn, project_filename) + self._read(fn)
+
+        seen = set()
+        with concurrent.futures.ThreadPoolExecutor(self.jobs) as pool:
+            pending = {pool.submit(read, fn, None)}
+            while pending:
+                done, pending = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        fn, project_filename, cached, root = future.result()
+                    except Exception as ex:
+                        # Errors are reported when the file is parsed
+                        logger.debug('Unable to prefetch: %s', ex)
+                        continue
+
+                    self._prefetched[fn.resolve()] = (cached, root)
+                    self.files_prefetched += 1
+                    if cached is None and root is None:
+                        # Streaming: nothing was read
+                        refs = []
+                    elif cached is not None:
+                        refs = _discover_cached_files(cached,
+                                                      project_filename, fn)
+                    else:
+                        refs = _discover_files(root, project_filename, fn)
+
+                    for ref, ref_project_filename in refs:
+                        if ref not in seen:
+                            seen.add(ref)
+                            pending.add(
+                                pool.submit(read, ref, ref_project_filename)
+                            )
+
+    def _get_loaded(self, fn):
+        'Get an item which was already loaded from the identity map'
+        try:
+            item = self.items_by_path[fn.resolve()]
+        except KeyError:
+            return None
+
+        logger.debug('Already loaded %s; not parsing again', fn)
+        self.duplicates_avoided += 1
+        return item
+
+    def _read(self, fn):
+        '''
+        Read a file, without building any items (thread-safe)
+
+        Returns
+        -------
+        cached : tuple or None
+            The cache entry, if valid
+        root : lxml.etree.Element or None
+            The root XML element, if not cached and not streaming
+        '''
+        try:
+            return self._prefetched.pop(fn.resolve())
+        except KeyError:
+            ...
+
+        if self.cache is not None:
+            cached = self.cache.load(fn)
+            if cached is not None:
+                return cached, None
+
+        if self.streaming:
+            return None, None
+
+        # Parsers are not thread-safe, so each read gets its own
+        parser = lxml.etree.XMLParser(**self.parser_options)
+        return None, lxml.etree.parse(str(fn), parser).getroot()
+
+    @property
+    def projecting(self):
+        'Whether `include` or `exclude` is in effect'
+        return ((self.include is not None or self.exclude is not None) and
+                not self.streaming)
+
+    def _project(self, element, parent, complete):
+        '''
+        Determine whether to build an element, when `projecting`
+
+        Parameters
+        ----------
+        element : lxml.etree.Element
+        parent : TwincatItem
+            The item the element's item will be attached to
+        complete : bool
+            Whether the parent is built in full
+
+        Returns
+        -------
+        build : bool or None
+            None to skip the element, False to build it while skipping
+            descendents as necessary, True to build it in full
+        '''
+        cls = _element_class(element)
+        if self.exclude is not None and issubclass(cls, self.exclude):
+            return None
+        if complete or self.include is None:
+            return True
+
+        tag = strip_namespace(element.tag)
+        if issubclass(cls, self.include) or (
+                tag in parent._required_children and
+                'File' not in element.attrib):
+            return True
+        if tag == 'Name' or cls._loads_files:
+            # Names are determined by child elements; file-loading classes
+            # are checked after loading (e.g., `Plc.post_init`)
+            return False
+
+        if 'File' not in element.attrib:
+            return False if _may_contain(element, self.include) else None
+
+        # The items built for the parent's file now depend on the contents
+        # of the referenced files, which the cache does not check
+        self._uncacheable.add(pathlib.Path(parent.filename).resolve())
+        if cls._load_path is USE_FILE_AS_PATH:
+            project_filename = None
+        else:
+            project_filename = parent.find_ancestor(Project).filename
+        fn = cls.get_file_path(element.attrib['File'],
+                               parent_filename=parent.filename,
+                               project_filename=project_filename)
+        # As in _discover_files, for the files referenced in turn
+        project = (parent if isinstance(parent, Project)
+                   else parent.find_ancestor(Project))
+        project_filename = project.filename if project is not None else None
+        return False if self._may_include(fn, project_filename) else None
+
+    def _may_include(self, fn, project_filename):
+        '''
+        Determine whether a file, or any file it references, may contain
+        instances of `include`
+
+        Files are read to check, and kept until built if they may.
+        '''
+        fn = self.paths.resolve(fn)
+        key = fn.resolve()
+        if key in self.items_by_path:
+            return True
+        if key in self._file_may_include:
+            return self._file_may_include[key]
+
+        # Guard against cyclic references while checking
+        self._file_may_include[key] = False
+        cached, root = self._read(fn)
+        if root is None:
+            # Cached entries are already projected; streaming is not
+            result = True
+        else:
+            result = (
+                _may_contain(root, self.include, include_self=True,
+                             files=False) or
+                any(self._may_include(ref, ref_project_filename)
+                    for ref, ref_project_filename in _discover_files(
+                        root, project_filename, fn))
+            )
+
+        self._file_may_include[key] = result
+        if result:
+            self._prefetched[key] = (cached, root)
+        return result
+
+    def _defer(self, fn, *, parent):
+        '''
+        Create the top-level item for a file from its opening tag, leaving
+        the rest to `_read_deferred` (see `defer_files`)
+        '''
+        key = fn.resolve()
+        cached, root = self._prefetched.pop(key, (None, None))
+        if root is not None:
+            # Already read; the file is only pending
+            start = pending = root
+        else:
+            for _, start in lxml.etree.iterparse(str(fn), events=('start', ),
+                                                 **self.parser_options):
+                break
+            pending = fn
+            self.files_deferred += 1
+            self._deferred.add(key)
+
+        classname, base = element_to_class_name(start)
+        cls = _get_item_class(classname, base, self)
+        item = cls.__new__(cls)
+        item._init_fields(
+            attributes=dict(start.attrib),
+            element=root,
+            filename=fn,
+            loader=self,
+            name=None,
+            parent=parent,
+            tag=start.tag,
+            text=(root.text.strip() if root is not None and root.text
+                  else None),
+        )
+        item._pending = pending
+        self.items_by_path[key] = item
+        if root is not None:
+            self.files_parsed += 1
+        item.post_init()
+        return item
+
+    def _read_deferred(self, item):
+        '''
+        Read the file of an item created by `_defer`, leaving it pending
+
+        Returns
+        -------
+        root : lxml.etree.Element
+        '''
+        fn = item._pending
+        logger.debug('Reading deferred file %s', fn)
+        _, root = self._read(fn)
+        if root.text and root.text.strip():
+            item.text = self.intern(root.text.strip())
+        if self.keep_elements:
+            item.element = root
+
+        key = fn.resolve()
+        if key in self._deferred:
+            # Count each file once, even if read again
+            self._deferred.remove(key)
+            self.files_parsed += 1
+        return root
+
+    def _build(self, fn, cached, root, *, parent=None):
+        'Build and register the item for a file from the result of `_read`'
+        if cached is not None:
+            item = TwincatItem.from_cache(cached, parent=parent, filename=fn,
+                                          loader=self)
+        else:
+            if root is not None:
+                item = TwincatItem.parse(root, filename=fn, parent=parent,
+                                         loader=self)
+            else:
+                item = TwincatItem.iterparse(fn, parent=parent, loader=self)
+            if self.cache is not None and fn.resolve() in self._uncacheable:
+                logger.debug('Not caching %s; its items depend on other '
+                             'files', fn)
+            elif self.cache is not None:
+                self.cache.store(fn, item.to_cache())
+
+        self.items_by_path[fn.resolve()] = item
+        self.files_parsed += 1
+        return item
+
+
+@functools.lru_cache(maxsize=None)
+def _pickled_attributes(cls):
+    '''
+    All slotted instance attributes of an item class, including those of
+    base classes, except `TwincatItem._unpickled_slots`
+
+    Returns
+    -------
+    names : tuple of str
+    has_dict : bool
+        Whether instances also have a ``__dict__``
+    '''
+    names = []
+    for klass in reversed(cls.__mro__):
+        slots = getattr(klass, '__slots__', ())
+        if isinstance(slots, str):
+            slots = (slots, )
+        names.extend(name for name in slots
+                     if name not in ('__dict__', '__weakref__') and
+                     name not in cls._unpickled_slots)
+    return tuple(names), cls.__dictoffset__ != 0
+
+
+def _new_item(cls, classname=None):
+    '''
+    Create an item without initializing it, for unpickling
+
+    Parameters
+    ----------
+    cls : class
+        The class of the item, or the base class if `classname` is given
+    classname : str, optional
+        The name of a generated class (see `get_class`)
+    '''
+    if classname is not None:
+        cls = get_class(classname, cls)
+    return cls.__new__(cls)
+
+
+class _FindIndex:
+    '''
+    A class-to-instances index of a tree, in the order `TwincatItem.find`
+    would yield them
+
+    As there are entries for every item, the index is kept compact: `items`
+    lists all indexed items in order, and `positions` has an array of the
+    positions in `items` of the instances of each class (other than
+    `object`, which would be all of them).  Each item with indexed
+    descendents is given its ``_find_index``, and the range of its
+    descendents in `items` as ``_find_start`` and ``_find_end``.
+    '''
+
+    def __init__(self, root):
+        self.items = []
+        self.positions = {}
+        self._add_descendents(root)
+
+    def _add(self, item):
+        position = len(self.items)
+        self.items.append(item)
+        for cls in type(item).__mro__[:-1]:
+            try:
+                self.positions[cls].append(position)
+            except KeyError:
+                self.positions[cls] = array.array('l', (position, ))
+
+    def _add_descendents(self, root):
+        # Depth-first, as in `TwincatItem.walk`, recording the range of each
+        # item once all of its descendents have been added
+        stack = [(root, len(self.items), root._find_targets())]
+        while stack:
+            item, start, targets = stack[-1]
+            for target, include, recurse in targets:
+                if include:
+                    self._add(target)
+                if recurse:
+                    stack.append((target, len(self.items),
+                                  target._find_targets()))
+                    break
+            else:
+                stack.pop()
+                end = len(self.items)
+                if end > start:
+                    item._find_index = self
+                    item._find_start = start
+                    item._find_end = end
+                else:
+                    # Nothing to find; `find` walks no further either way
+                    item._find_index = None
+
+    def lookup(self, cls, start, end):
+        '''
+        Instances of `cls` in the given range of items
+
+        Returns
+        -------
+        items : list of TwincatItem
+        '''
+        if cls is object:
+            return self.items[start:end]
+        positions = self.positions.get(cls, ())
+        first = bisect.bisect_left(positions, start)
+        last = bisect.bisect_left(positions, end, first)
+        return [self.items[pos] for pos in positions[first:last]]
+
+
+class TwincatLeaf:
+    '''
+    A compact stand-in for the `TwincatItem` of a text-only XML element,
+    e.g., ``<BitSize>16</BitSize>``, used with ``Loader(compact_leaves=True)``
+
+    Leaves have the `tag`, `text`, `attributes`, `children`, `comments` and
+    `name` of an item, so ``symbol.BitSize[0].text`` works either way.  They
+    have no parent, element, or filename, and `TwincatItem.find` yields them
+    only when searching for `TwincatLeaf` itself.
+
+    Parameters
+    ----------
+    tag : str
+    text : str or None
+    '''
+    __slots__ = ('tag', 'text')
+    attributes = types.MappingProxyType({})
+    children = _EMPTY
+    comments = _EMPTY
+    name = None
+
+    def __init__(self, tag, text):
+        self.tag = tag
+        self.text = text
+
+    def to_cache(self):
+        'Serialize this leaf for `TwincatItem.from_cache`'
+        return (self.tag, self.text)
+
+    def __reduce__(self):
+        return TwincatLeaf, (self.tag, self.text)
+
+    def __repr__(self):
+        info = f'text={self.text!r}' if self.text else ''
+        return f'<{strip_namespace(self.tag)} {info}>'
+
+
 class TwincatItem:
+    # Instances are numerous (hundreds of thousands for large TMC files), so
+    # attributes are slotted; subclasses should define ``__slots__`` as well.
+    # Children are available as attributes by tag through `__getattr__`.
+    __slots__ = ('attributes', 'element', 'filename', 'loader', 'name',
+                 'parent', 'tag', 'text', '_children', '_children_by_tag',
+                 '_comments', '_find_index', '_find_start', '_find_end',
+                 '_pending')
+    _generated = False
     _load_path = ''
-
-    def __init__(self, element, *, parent=None, name=None, filename=None):
+    # Loads further files in post_init, beyond those referenced by ``File``
+    _loads_files = False
+    # Tags of children used by the class itself, always built in full unless
+    # in another file (see `Loader.include`)
+    _required_children = ()
+
+    def __init__(self, element, *, parent=None, name=None, filename=None,
+                 loader=None):
         '''
         Represents a single TwinCAT project XML Element, for either tsproj,
         xti, tmc, etc.
@@ -94,28 +946,103 @@ class TwincatItem:
         Parameters
         ----------
         element : lxml.etree.Element
+            Kept as `element`, unless disabled by `Loader.keep_elements`
         parent : TwincatItem, optional
         name : str, optional
         filename : pathlib.Path, optional
+        loader : Loader, optional
+            Defaults to the loader of the parent
         '''
-        self.attributes = dict(element.attrib)
-        self.children = []
-        self.comments = []
-        self.children_by_tag = None
-        self.element = element
+        self._init_element(element, filename=filename, loader=loader,
+                           name=name, parent=parent)
+        if self._pending is None:
+            self._add_children(element)
+        self.post_init()
+
+    def _init_element(self, element, *, filename, loader, name, parent):
+        'Initialize all instance attributes from an element, without children'
+        self._init_fields(
+            attributes=dict(element.attrib),
+            element=element,
+            filename=filename,
+            loader=loader,
+            name=name,
+            parent=parent,
+            tag=element.tag,
+            text=element.text.strip() if element.text else None,
+        )
+        if getattr(self.loader, 'lazy', False):
+            # Children are added by `_materialize`, but the name is required
+            # right away (see `_attach_child`)
+            self._pending = element
+            if parent is not None:
+                for child in element.iterchildren('Name'):
+                    if child.text:
+                        self.name = child.text.strip()
+
+    def _init_fields(self, *, attributes, element, filename, loader, name,
+                     parent, tag, text):
+        'Initialize all instance attributes, without any children'
+        loader = (loader if loader is not None
+                  else getattr(parent, 'loader', None))
+        if loader is not None and loader.intern_strings:
+            intern = loader.intern
+            tag = intern(tag)
+            text = intern(text)
+            if attributes:
+                attributes = {intern(key): intern(value)
+                              for key, value in attributes.items()}
+        if parent is not None and 'Name' in attributes:
+            # Named right away, such that the same name is seen by post_init
+            # of the descendents however the item is built (see
+            # `_attach_child`)
+            name = attributes.pop('Name').strip()
+
+        self.attributes = attributes
+        self._children = _EMPTY
+        self._children_by_tag = None
+        self._comments = _EMPTY
+        self._find_index = None
+        self._find_start = self._find_end = None
+        self._pending = None
         self.filename = filename
+        self.loader = loader
+        self.element = (element if getattr(self.loader, 'keep_elements', True)
+                        else None)
         self.name = name
         self.parent = parent
-        self.tag = element.tag
-        self.text = element.text.strip() if element.text else None
-
-        self._add_children(element)
-        self.post_init()
+        self.tag = tag
+        self.text = text
 
     def post_init(self):
         'Hook for subclasses; called after __init__'
         ...
 
+    @property
+    def children(self):
+        'Child items, built on first access if loaded lazily'
+        if self._pending is not None:
+            self._materialize()
+        return self._children
+
+    @property
+    def comments(self):
+        'XML comments, read on first access if loaded lazily'
+        if self._pending is not None:
+            self._materialize()
+        return self._comments
+
+    def _materialize(self):
+        'Add the children of a lazily-loaded item'
+        element, self._pending = self._pending_element(), None
+        self._add_children(element)
+
+    def _pending_element(self):
+        'The XML element of a lazily-loaded item, reading its file if deferred'
+        if isinstance(self._pending, pathlib.Path):
+            return self.loader._read_deferred(self)
+        return self._pending
+
     @property
     def root(self):
         'The top-level TwincatItem (likely TcSmProject)'
@@ -164,34 +1091,196 @@ class TwincatItem:
         '''
         Find any descendents that are instances of cls
 
+        Uses the index from `build_find_index`, if available.
+
         Parameters
         ----------
         cls : TwincatItem
         '''
+        if self._find_index is not None and isinstance(cls, type):
+            yield from self._find_index.lookup(cls, self._find_start,
+                                               self._find_end)
+            return
+
+        def prune(item):
+            # Nothing to find in lazily-loaded items; leave them be
+            if item._pending is None:
+                return False
+            deferred = isinstance(item._pending, pathlib.Path)
+            if deferred and (item._pending, cls) in item.loader._misses:
+                return True
+            element = item._pending_element()
+            if not _may_contain(element, cls):
+                # The XML of deferred files is not kept in this case, but
+                # the result is, so the file is not read again by the next
+                # search
+                if deferred:
+                    item.loader._misses.add((item._pending, cls))
+                return True
+            item._pending = element
+            return False
+
+        for item in self.walk(prune=prune):
+            if isinstance(item, cls):
+                yield item
+
+    def walk(self, *, prune=None):
+        '''
+        Iterate over all descendents searched by `find`, depth-first in
+        document order
+
+        Uses an explicit stack, so the cost per item does not depend on its
+        depth in the tree.
+
+        Parameters
+        ----------
+        prune : callable, optional
+            Called with each item (including this one) before its descendents
+            are walked; if it returns True, they are skipped.
+
+        Yields
+        ------
+        item : TwincatItem or TwincatLeaf
+        '''
+        if prune is not None and prune(self):
+            return
+
+        stack = [self._find_targets()]
+        while stack:
+            for item, include, recurse in stack[-1]:
+                if include:
+                    yield item
+                if recurse and (prune is None or not prune(item)):
+                    stack.append(item._find_targets())
+                    break
+            else:
+                stack.pop()
+
+    def _find_targets(self):
+        '''
+        Items searched by `find`, as tuples of::
+
+            (item, include_item, search_descendents)
+        '''
         for child in self.children:
-            if isinstance(child, cls):
-                yield child
-            yield from child.find(cls)
+            yield child, True, not isinstance(child, TwincatLeaf)
+
+    def build_find_index(self):
+        '''
+        Index all descendents by class, such that `find` on this item or any
+        of its descendents becomes a lookup rather than a full search
+
+        Called by `load_project`.  The index is not updated if the tree is
+        later modified; call this again if necessary.
+
+        The index costs roughly 30 to 40 bytes per item (about 10 MB for a
+        project of 300,000 items), depending on the depth of the class
+        hierarchy.
+        '''
+        _FindIndex(self)
 
     def _add_children(self, element):
-        'A hook for adding all children'
-        for child in element.iterchildren():
-            self._add_child(child)
-
-        by_tag = separate_children_by_tag(self.children)
-        self.children_by_tag = types.SimpleNamespace(**by_tag)
-        for key, value in by_tag.items():
-            if not hasattr(self, key):
-                setattr(self, key, value)
-
-    def _add_child(self, element):
-        'Add a single child to the list of children'
-        if isinstance(element, lxml.etree._Comment):
-            self.comments.append(element.text)
-            return
+        '''
+        Build and add all children of the element
+
+        The subtree is built depth-first with an explicit stack, rather than
+        by recursion, such that deeply-nested elements are not limited by the
+        Python recursion limit.  Each child is complete, including
+        `post_init`, by the time it is attached to its parent.
+
+        Elements are skipped as configured by `Loader.include` and
+        `Loader.exclude`.
+        '''
+        loader = self.loader
+        projecting = loader is not None and loader.projecting
+        full = not projecting or self._included()
+        stack = [(self, element.iterchildren(), full)]
+        while stack:
+            item, children, full = stack[-1]
+            for child in children:
+                if isinstance(child, lxml.etree._Comment):
+                    item._add_comment(child.text)
+                    continue
+
+                if projecting:
+                    build = loader._project(child, item, full)
+                    if build is None:
+                        continue
+                else:
+                    build = True
+
+                child_item, complete = TwincatItem._start_item(
+                    child, parent=item, filename=item.filename)
+                if complete:
+                    item._attach_child(child_item)
+                else:
+                    stack.append((child_item, child.iterchildren(), build))
+                    break
+            else:
+                stack.pop()
+                if stack:
+                    item.post_init()
+                    stack[-1][0]._attach_child(item)
+
+    def _included(self):
+        '''
+        Whether this item is built in full under `Loader.include`, as it or
+        an ancestor is either included or required
+        '''
+        include = self.loader.include
+        if include is None:
+            return True
+        item = self
+        while item is not None:
+            parent = item.parent
+            if isinstance(item, include):
+                return True
+            if (parent is not None and item.filename == parent.filename and
+                    strip_namespace(item.tag) in parent._required_children):
+                return True
+            item = parent
+        return False
+
+    @property
+    def children_by_tag(self):
+        'Children categorized by tag, as a namespace of lists'
+        if self._children_by_tag is None:
+            self._children_by_tag = types.SimpleNamespace(
+                **separate_children_by_tag(self.children))
+        return self._children_by_tag
+
+    def __getattr__(self, attr):
+        'Children by tag are available as attributes, e.g., ``item.Axis``'
+        descriptor = getattr(type(self), attr, None)
+        if (descriptor is not None and
+                not isinstance(descriptor, types.MemberDescriptorType)):
+            # A property raised AttributeError itself; raise that rather than
+            # hiding it behind the name of the property
+            return object.__getattribute__(self, attr)
+        if (not attr.startswith('_') and
+                attr not in ('children', 'comments') and
+                attr not in TwincatItem.__slots__ and self.children):
+            try:
+                return getattr(self.children_by_tag, attr)
+            except AttributeError:
+                ...
+        raise AttributeError(
+            f'{type(self).__name__!r} object has no attribute {attr!r}')
+
+    def _add_comment(self, text):
+        'Add a single comment'
+        if self._comments:
+            self._comments.append(text)
+        else:
+            self._comments = [text]
 
-        child = self.parse(element, parent=self, filename=self.filename)
-        self.children.append(child)
+    def _attach_child(self, child):
+        'Append an already-constructed child and determine names'
+        if self._children:
+            self._children.append(child)
+        else:
+            self._children = [child]
+        self._children_by_tag = None
 
         # Two ways for names to come in:
         # 1. the child has a tag of 'Name', with its text being our name
@@ -199,16 +1288,13 @@ class TwincatItem:
             name = child.text.strip()
             self.name = name
 
-        # 2. the child has an attribute key 'Name'
-        try:
-            name = child.attributes.pop('Name').strip()
-        except KeyError:
-            ...
-        else:
-            child.name = name
+        # 2. the child has an attribute key 'Name' (usually already handled
+        #    by _init_fields)
+        if 'Name' in child.attributes:
+            child.name = child.attributes.pop('Name').strip()
 
     @staticmethod
-    def parse(element, parent=None, filename=None):
+    def parse(element, parent=None, filename=None, loader=None):
         '''
         Parse an XML element and return a TwincatItem
 
@@ -219,27 +1305,278 @@ class TwincatItem:
             The parent to assign to the new element
         filename : str, optional
             The filename the element originates from
+        loader : Loader, optional
+            Defaults to the loader of the parent
 
         Returns
         -------
         item : TwincatItem
         '''
+        item, complete = TwincatItem._start_item(
+            element, parent=parent, filename=filename, loader=loader)
+        if not complete:
+            item._add_children(element)
+            item.post_init()
+        return item
 
-        classname, base = element_to_class_name(element)
+    @staticmethod
+    def _start_item(element, *, parent, filename, loader=None):
+        '''
+        Create the item for an XML element, without adding its children
 
-        try:
-            cls = TWINCAT_TYPES[classname]
-        except KeyError:
-            # Dynamically create and register new TwincatItem-based types!
-            cls = type(classname, (base, ), {})
-            _register_type(cls)
+        Returns
+        -------
+        item : TwincatItem or TwincatLeaf
+        complete : bool
+            False if the children of the element are still to be added, and
+            `post_init` called
+        '''
+        if loader is None:
+            loader = getattr(parent, 'loader', None)
+        classname, base = element_to_class_name(element)
+        cls = _get_item_class(classname, base, loader)
 
         if 'File' in element.attrib:
             # This is defined directly in the file. Instantiate it as-is:
             filename = element.attrib['File']
-            return cls.from_file(filename, parent=parent)
+            return cls.from_file(filename, parent=parent), True
+
+        if (cls._generated and not element.attrib and not len(element) and
+                getattr(loader, 'compact_leaves', False)):
+            text = element.text.strip() if element.text else None
+            return TwincatLeaf(loader.intern(element.tag),
+                               loader.intern(text)), True
+
+        item = cls.__new__(cls)
+        item._init_element(element, filename=filename, loader=loader,
+                           name=None, parent=parent)
+        if item._pending is not None:
+            item.post_init()
+            return item, True
+        return item, False
+
+    @staticmethod
+    def iterparse(fn, *, parent=None, loader=None):
+        '''
+        Parse a file incrementally, building items as their XML elements are
+        read and discarding each element once its item is built
+
+        Peak memory for the XML then scales with the depth of the document
+        rather than its size.  The resulting items have no `element`.
+
+        Parameters
+        ----------
+        fn : pathlib.Path
+            The filename
+        parent : TwincatItem, optional
+            The parent to assign to the top-level item
+        loader : Loader, optional
+            Defaults to the loader of the parent
+
+        Returns
+        -------
+        item : TwincatItem
+        '''
+        # Items under construction, as (item, complete, base_type_pending).
+        # Those included from a separate file are complete already, and
+        # their (empty) XML subtree is skipped.  Symbols start out as
+        # `Symbol` until their BaseType is read (see `_adopt_fields`).
+        stack = []
+        skip_depth = 0
+        root = None
+
+        events = lxml.etree.iterparse(
+            str(fn), events=('start', 'end', 'comment'),
+            **getattr(loader, 'parser_options', {}))
+        for event, element in events:
+            if event == 'comment':
+                if stack and not skip_depth:
+                    stack[-1][0]._add_comment(element.text)
+                continue
+
+            if event == 'start':
+                if skip_depth:
+                    skip_depth += 1
+                    continue
+
+                item_parent = stack[-1][0] if stack else parent
+                if 'File' in element.attrib:
+                    cls = get_class(*element_to_class_name(element))
+                    item = cls.from_file(element.attrib['File'],
+                                         parent=item_parent)
+                    stack.append((item, True, False))
+                    skip_depth = 1
+                    continue
+
+                symbol = strip_namespace(element.tag) == 'Symbol'
+                if symbol:
+                    # Determined by the BaseType, once it has been read
+                    cls = Symbol
+                else:
+                    cls = get_class(*element_to_class_name(element))
+
+                item = cls.__new__(cls)
+                item._init_fields(
+                    attributes=dict(element.attrib), element=None,
+                    filename=fn, loader=loader, name=None,
+                    parent=item_parent, tag=element.tag, text=None,
+                )
+                stack.append((item, False, symbol))
+                continue
+
+            # event == 'end'
+            if skip_depth > 1:
+                skip_depth -= 1
+                continue
+
+            skip_depth = 0
+            item, complete, base_type_pending = stack.pop()
+            if not complete:
+                item.text = element.text.strip() if element.text else None
+                if item.loader is not None:
+                    item.text = item.loader.intern(item.text)
+                if base_type_pending:
+                    raise ValueError(
+                        f'Symbol without a BaseType in {fn}: {item.name}')
+                if (type(item)._generated and not item.attributes and
+                        item.name is None and
+                        not item.children and not item.comments and
+                        getattr(item.loader, 'compact_leaves', False)):
+                    item = TwincatLeaf(item.tag, item.text)
+                else:
+                    item.post_init()
+
+            if stack:
+                parent_item, _, base_type_pending = stack[-1]
+                parent_item._attach_child(item)
+                if base_type_pending and item.tag == 'BaseType':
+                    cls = _get_item_class(f'Symbol_{item.text}', Symbol,
+                                          parent_item.loader)
+                    symbol = cls.__new__(cls)
+                    symbol._adopt_fields(parent_item)
+                    stack[-1] = (symbol, False, False)
+            else:
+                root = item
+
+            # Discard the XML that is no longer required
+            element.clear()
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+
+        return root
+
+    def _adopt_fields(self, item):
+        '''
+        Take over all fields of an incomplete `TwincatItem`, including its
+        children, in place of re-assigning ``__class__`` (which requires
+        classes with the same layout)
+        '''
+        for name in TwincatItem.__slots__:
+            setattr(self, name, getattr(item, name))
+        for child in self._children:
+            if isinstance(child, TwincatItem):
+                child.parent = self
+
+    def to_cache(self):
+        '''
+        Serialize this item and all of its descendents from the same file
+
+        The entry is flat, such that neither building nor pickling it
+        depends on the depth of the tree: a tuple of records in document
+        order, each of which is one of::
+
+            (classname, base_name, tag, text, name, attributes, comments,
+             number_of_children)
+            (tag, text)         # a TwincatLeaf
+            (None, filename)    # a child included from another file
+
+        Children included from other files are stored only by their absolute
+        filename, as is the cache key (see `ParseCache.entry_path`), and
+        derived attributes (those set by `post_init`) are not stored.
+
+        Returns
+        -------
+        entry : tuple
+            Suitable for `TwincatItem.from_cache`
+        '''
+        entry = []
+        stack = [self]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, TwincatLeaf):
+                entry.append(item.to_cache())
+            elif item is not self and item.filename != self.filename:
+                filename = pathlib.Path(item.filename).absolute()
+                entry.append((None, str(filename)))
+            else:
+                cls = type(item)
+                children = item.children
+                entry.append((cls.__name__, cls.__bases__[0].__name__,
+                              item.tag, item.text, item.name, item.attributes,
+                              item.comments, len(children)))
+                stack.extend(reversed(children))
+        return tuple(entry)
+
+    @staticmethod
+    def from_cache(entry, *, parent=None, filename=None, loader=None):
+        '''
+        Re-create an item from `TwincatItem.to_cache`, without the XML
 
-        return cls(element, parent=parent, filename=filename)
+        Children included from other files are parsed again by way of the
+        loader, and `post_init` is re-run on every item.  As with
+        `_add_children`, each child is complete by the time it is attached
+        to its parent.
+
+        Parameters
+        ----------
+        entry : tuple
+        parent : TwincatItem, optional
+            The parent to assign to the new element
+        filename : pathlib.Path, optional
+            The filename the entry originates from
+        loader : Loader, optional
+            Defaults to the loader of the parent
+
+        Returns
+        -------
+        item : TwincatItem
+        '''
+        # [item, number of children remaining] for incomplete items
+        stack = []
+        for record in entry:
+            item_parent = stack[-1][0] if stack else parent
+            if record[0] is None:
+                item = parse(record[1], parent=item_parent)
+            elif len(record) == 2:
+                item = TwincatLeaf(*record)
+            else:
+                (classname, base_name, tag, text, name, attributes, comments,
+                 num_children) = record
+                cls = get_class(classname, globals()[base_name])
+                item = cls.__new__(cls)
+                item._init_fields(attributes=attributes, element=None,
+                                  filename=filename,
+                                  loader=loader if not stack else None,
+                                  name=name, parent=item_parent, tag=tag,
+                                  text=text)
+                item._comments = comments
+                if num_children:
+                    stack.append([item, num_children])
+                    continue
+                item.post_init()
+
+            # Attach the complete item, completing its parents in turn
+            while stack:
+                incomplete = stack[-1]
+                incomplete[0]._attach_child(item)
+                incomplete[1] -= 1
+                if incomplete[1]:
+                    break
+                stack.pop()
+                item = incomplete[0]
+                item.post_init()
+            else:
+                return item
 
     def _repr_info(self):
         '__repr__ information'
@@ -257,23 +1594,119 @@ class TwincatItem:
 
         return f'<{self.__class__.__name__} {info}>'
 
+    # Not part of the pickled state; see __getstate__
+    _unpickled_slots = ('element', 'loader', 'parent', '_children_by_tag',
+                        '_find_index', '_find_start', '_find_end',
+                        '_pending')
+
+    def __reduce__(self):
+        '''
+        Pickle support, including for generated classes, which are created
+        again on unpickling if necessary (see `get_class`)
+        '''
+        cls = type(self)
+        if cls._generated:
+            return _new_item, (cls.__bases__[0], cls.__name__), \
+                self.__getstate__()
+        return _new_item, (cls, ), self.__getstate__()
+
+    def __getstate__(self):
+        '''
+        The state of this item and its subtree for pickling, without the XML
+        element, loader, parent, or `find` index
+
+        Lazily-loaded children are built first.  Unpickled items are
+        therefore detached: the parent of the unpickled item is None, and
+        `build_find_index` may be used to index it again.
+        '''
+        if self._pending is not None:
+            self._materialize()
+        names, has_dict = _pickled_attributes(type(self))
+        state = {}
+        for name in names:
+            try:
+                state[name] = getattr(self, name)
+            except AttributeError:
+                # Unset slot
+                ...
+        if has_dict:
+            state.update(self.__dict__)
+        return state
+
+    def __copy__(self):
+        '''
+        A shallow copy, sharing all attributes, including the children
+
+        Unlike unpickling (or `copy.deepcopy`), the children are not given
+        the copy as their parent.
+        '''
+        cls = type(self)
+        item = cls.__new__(cls)
+        names, has_dict = _pickled_attributes(cls)
+        for name in names + self._unpickled_slots:
+            try:
+                setattr(item, name, getattr(self, name))
+            except AttributeError:
+                # Unset slot
+                ...
+        if has_dict:
+            item.__dict__.update(self.__dict__)
+        return item
+
+    def __setstate__(self, state):
+        'Restore the state from `__getstate__`'
+        for name in self._unpickled_slots:
+            setattr(self, name, None)
+        for name, value in state.items():
+            setattr(self, name, value)
+        for child in self._children:
+            if isinstance(child, TwincatItem):
+                child.parent = self
+
     @classmethod
     def from_file(cls, filename, parent):
         if cls._load_path is USE_FILE_AS_PATH:
-            parent_root = pathlib.Path(parent.filename).parent
-            full_path = (parent_root / pathlib.Path(parent.filename).stem /
-                         filename)
+            project_filename = None
         else:
-            project = parent.find_ancestor(Project)
-            project_root = pathlib.Path(project.filename).parent
-            full_path = project_root / cls._load_path / filename
+            project_filename = parent.find_ancestor(Project).filename
+        full_path = cls.get_file_path(filename,
+                                      parent_filename=parent.filename,
+                                      project_filename=project_filename)
         return parse(full_path, parent=parent)
 
+    @classmethod
+    def get_file_path(cls, filename, *, parent_filename, project_filename):
+        '''
+        Get the full path to a file referenced by a ``File`` attribute
+
+        Parameters
+        ----------
+        filename : str
+            The ``File`` attribute
+        parent_filename : pathlib.Path
+            The file containing the referencing element
+        project_filename : pathlib.Path
+            The file containing the nearest `Project` ancestor of the parent
+            of the referencing element.  Unused for `USE_FILE_AS_PATH`.
+
+        Returns
+        -------
+        path : pathlib.Path
+        '''
+        if cls._load_path is USE_FILE_AS_PATH:
+            parent_root = pathlib.Path(parent_filename).parent
+            return parent_root / pathlib.Path(parent_filename).stem / filename
+
+        project_root = pathlib.Path(project_filename).parent
+        return project_root / cls._load_path / filename
+
 
 class _TwincatProjectSubItem(TwincatItem):
     '''
     [XTI, TMC, ...] A base class for items that appear in virtual PLC projects
     '''
+    __slots__ = ()
+
     @property
     def project(self):
         'The nested project (virtual PLC project) associated with the item'
@@ -289,6 +1722,7 @@ class Module(TwincatItem):
 
     Contains generated symbols, data areas, and miscellaneous properties.
     '''
+    _required_children = ('Properties', )
 
     @property
     def ads_port(self):
@@ -316,7 +1750,7 @@ class Property(TwincatItem):
           GeneratedCodeSize
           GlobalDataSize
     '''
-    ...
+    __slots__ = ()
 
 
 @_register_type
@@ -324,7 +1758,7 @@ class OwnerA(TwincatItem):
     '''
     [XTC] For a Link between VarA and VarB, this is the parent of VarA
     '''
-    ...
+    __slots__ = ()
 
 
 @_register_type
@@ -332,17 +1766,98 @@ class OwnerB(TwincatItem):
     '''
     [XTC] For a Link between VarA and VarB, this is the parent of VarB
     '''
-    ...
+    __slots__ = ()
 
 
 @_register_type
 class Link(TwincatItem):
     '[XTI] Links between NC/PLC/IO'
+    __slots__ = ('a', 'b')
+
     def post_init(self):
         self.a = (self.find_ancestor(OwnerA).name, self.attributes.get('VarA'))
         self.b = (self.find_ancestor(OwnerB).name, self.attributes.get('VarB'))
 
 
+def normalize_link_variable(variable):
+    '''
+    Normalize a link variable name for lookup: strip off everything up to the
+    last ``^`` (e.g., the ``PlcTask Inputs`` data area) and lowercase it
+
+    For example, ``PlcTask Inputs^MAIN.M1.Axis.NcToPlc`` becomes
+    ``main.m1.axis.nctoplc``.
+    '''
+    return variable.rsplit('^', 1)[-1].strip().lower()
+
+
+class LinkIndex:
+    '''
+    An index of `Link` items by variable and owner name
+
+    Each link is indexed under every dotted prefix of its normalized
+    variables (see `normalize_link_variable`), such that
+    ``PlcTask Inputs^MAIN.M1.Axis.NcToPlc`` may be found by ``MAIN.M1``.
+
+    Parameters
+    ----------
+    links : iterable of Link
+    '''
+
+    def __init__(self, links):
+        self.links = list(links)
+        self._by_variable = collections.defaultdict(list)
+        self._by_owner = collections.defaultdict(list)
+
+        for link in self.links:
+            for side, owner_cls in (('a', OwnerA), ('b', OwnerB)):
+                owner = link.find_ancestor(owner_cls)
+                entry = (side, owner.name if owner else None, link)
+                self._by_owner[entry[1]].append(entry)
+
+                variable = link.attributes.get(f'Var{side.upper()}')
+                if not variable:
+                    continue
+
+                parts = normalize_link_variable(variable).split('.')
+                for idx in range(1, len(parts) + 1):
+                    self._by_variable['.'.join(parts[:idx])].append(entry)
+
+    def find(self, variable=None, *, owner=None, side=None):
+        '''
+        Find links by variable and/or owner name
+
+        Parameters
+        ----------
+        variable : str, optional
+            The variable or any dotted prefix of it, e.g. ``MAIN.M1``
+        owner : str, optional
+            The full owner name, e.g. ``TINC^NC-Task 1 SAF^Axes^Axis 1``
+        side : {'a', 'b'}, optional
+            Restrict `variable` and `owner` to VarA/OwnerA or VarB/OwnerB
+
+        Returns
+        -------
+        links : list of Link
+            In the order they appear in the project
+        '''
+        if variable is not None:
+            entries = self._by_variable.get(
+                normalize_link_variable(variable), [])
+        elif owner is not None:
+            entries = self._by_owner.get(owner, [])
+        else:
+            entries = [(side, None, link) for link in self.links]
+
+        links = {}
+        for entry_side, entry_owner, link in entries:
+            if side is not None and entry_side != side:
+                continue
+            if owner is not None and entry_owner != owner:
+                continue
+            links[id(link)] = link
+        return list(links.values())
+
+
 @_register_type
 class Symbol(_TwincatProjectSubItem):
     '''
@@ -352,16 +1867,23 @@ class Symbol(_TwincatProjectSubItem):
     and searching.  For example, a function block defined as `FB_MotionStage`
     will become `Symbol_FB_MotionStage`.
     '''
+    __slots__ = ()
+
     @property
     def module(self):
         'The Module containing the Symbol'
         return self.find_ancestor(Module)
 
+    @property
+    def base_type(self):
+        'The base type name, e.g., ``FB_MotionStage``'
+        return self.BaseType[0].text
+
     @property
     def info(self):
         return dict(name=self.name,
                     bit_size=self.BitSize[0].text,
-                    base_type=self.BaseType[0].text,
+                    base_type=self.base_type,
                     bit_offs=self.BitOffs[0].text,
                     module=self.module.name,
                     )
@@ -372,6 +1894,8 @@ class Symbol_FB_MotionStage(Symbol):
     '''
     [TMC] A customized Symbol, representing only FB_MotionStage
     '''
+    __slots__ = ()
+
     def _repr_info(self):
         '__repr__ information'
         repr_info = super()._repr_info()
@@ -392,11 +1916,17 @@ class Symbol_FB_MotionStage(Symbol):
     @property
     def pou(self):
         'The POU program associated with the Symbol'
-        # TODO: hack
-        for pou in self.root.find(POU):
+        plc = self.project
+        if plc is not None and self.program_name in plc.pou_by_name:
+            return plc.pou_by_name[self.program_name]
+
+        root = self.root
+        if isinstance(root, TcSmProject):
+            return root.pou_by_name.get(self.program_name)
+
+        for pou in root.find(POU):
             if pou.name == self.program_name:
                 return pou
-        # return self.project.pou_by_name[self.program_name]
 
     @property
     def call_block(self):
@@ -438,9 +1968,8 @@ class Symbol_FB_MotionStage(Symbol):
 
         links = [
             link
-            for link in self.project.find(Link)
-            if f'^{linked_to_full.lower()}' in link.attributes['VarA'].lower()
-            and 'NcToPlc' in link.attributes['VarA']
+            for link in self.project.link_index.find(linked_to_full, side='a')
+            if 'NcToPlc' in link.attributes['VarA']
         ]
 
         if not links:
@@ -472,7 +2001,7 @@ class GVL(_TwincatProjectSubItem):
     '''
     [XTI] A Global Variable List
     '''
-    ...
+    __slots__ = ()
 
 
 @_register_type
@@ -480,6 +2009,7 @@ class POU(_TwincatProjectSubItem):
     '''
     [XTI] A Program Organization Unit
     '''
+    __slots__ = ()
 
     # TODO: may fail when mixed with ladder logic?
 
@@ -505,8 +2035,13 @@ class POU(_TwincatProjectSubItem):
 
     @property
     def call_blocks(self):
-        'A dictionary of all implementation call blocks'
-        return get_pou_call_blocks(self.declaration, self.implementation)
+        '''
+        A dictionary of all implementation call blocks
+
+        Cached based on the declaration and implementation text; do not modify
+        the returned dictionary.
+        '''
+        return _cached_pou_call_blocks(self.declaration, self.implementation)
 
     @property
     def program_name(self):
@@ -515,8 +2050,13 @@ class POU(_TwincatProjectSubItem):
 
     @property
     def variables(self):
-        'A dictionary of variables defined in the POU'
-        return variables_from_declaration(self.declaration)
+        '''
+        A dictionary of variables defined in the POU
+
+        Cached based on the declaration text; do not modify the returned
+        dictionary.
+        '''
+        return _cached_variables_from_declaration(self.declaration)
 
 
 @_register_type
@@ -526,7 +2066,7 @@ class AxisPara(TwincatItem):
 
     Has information on units, acceleration, deadband, etc.
     '''
-    ...
+    __slots__ = ()
 
 
 @_register_type
@@ -560,6 +2100,7 @@ class Axis(TwincatItem):
     '''
     [XTI] A single NC axis
     '''
+    __slots__ = ()
     _load_path = pathlib.Path('_Config') / 'NC' / 'Axes'
 
     @property
@@ -606,7 +2147,7 @@ class EncPara(TwincatItem):
     Includes such parameters as ScaleFactorNumerator, ScaleFactorDenominator,
     and so on.
     '''
-    ...
+    __slots__ = ()
 
 
 @_register_type
@@ -616,6 +2157,8 @@ class Encoder(TwincatItem):
 
     Contains EncPara, Vars, Mappings, etc.
     '''
+    __slots__ = ()
+
     def summarize(self):
         yield 'EncType', self.attributes['EncType']
         for param in self.find(EncPara):
@@ -630,6 +2173,7 @@ class Project(TwincatItem):
     '''
     [tsproj] A project which contains Plc, Io, Mappings, etc.
     '''
+    __slots__ = ()
     _load_path = pathlib.Path('_Config') / 'PLC'
 
     @property
@@ -655,6 +2199,39 @@ class TcSmProject(TwincatItem):
     '''
     [tsproj] A top-level TwinCAT tsproj
     '''
+    _link_index = None
+    _pou_by_name = None
+    _symbols_by_type = None
+
+    @property
+    def link_index(self):
+        'A `LinkIndex` of all links in the project, built on first use'
+        if self._link_index is None:
+            self._link_index = LinkIndex(self.find(Link))
+        return self._link_index
+
+    @property
+    def symbols_by_type(self):
+        'All symbols in the project by base type, built on first use'
+        if self._symbols_by_type is None:
+            self._symbols_by_type = symbols_by_type(self.find(Symbol))
+        return self._symbols_by_type
+
+    @property
+    def pou_by_name(self):
+        '''
+        All POUs in the project, keyed on name
+
+        If more than one PLC project defines a POU of the same name, the first
+        one found is used.  See `Plc.pou_by_name` for a single PLC.
+        '''
+        if self._pou_by_name is None:
+            pou_by_name = {}
+            for pou in self.find(POU):
+                pou_by_name.setdefault(pou.name, pou)
+            self._pou_by_name = pou_by_name
+        return self._pou_by_name
+
     @property
     def plcs(self):
         'The nested projects (virtual PLC project) contained in this Project'
@@ -671,7 +2248,7 @@ class TcSmItem(TwincatItem):
     latter portion being derived from the `ClassName` attribute in the XML
     file.
     '''
-    ...
+    __slots__ = ()
 
 
 @_register_type
@@ -679,6 +2256,7 @@ class Device(TwincatItem):
     '''
     [XTI] Top-level IO device container
     '''
+    __slots__ = ()
     _load_path = pathlib.Path('_Config') / 'IO'
 
 
@@ -687,6 +2265,7 @@ class Box(TwincatItem):
     '''
     [XTI] A box / module
     '''
+    __slots__ = ()
     _load_path = USE_FILE_AS_PATH
 
 
@@ -695,6 +2274,25 @@ class Plc(TwincatItem):
     '''
     [XTI] A Plc Project
     '''
+    _loads_files = True
+    _required_children = ('Project', )
+    _link_index = None
+    _symbols_by_type = None
+
+    @property
+    def link_index(self):
+        'A `LinkIndex` of all links in the PLC project, built on first use'
+        if self._link_index is None:
+            self._link_index = LinkIndex(self.find(Link))
+        return self._link_index
+
+    @property
+    def symbols_by_type(self):
+        'All symbols in the PLC project by base type, built on first use'
+        if self._symbols_by_type is None:
+            self._symbols_by_type = symbols_by_type(self.find(Symbol))
+        return self._symbols_by_type
+
     def post_init(self):
         self.namespaces = {}
         if hasattr(self, 'Project'):
@@ -718,16 +2316,21 @@ class Plc(TwincatItem):
                     if self.tmc_path.exists()
                     else None)
 
+        # Only the PLC project lists source files; searching the TMC as well
+        # would build (or read, if deferred) all of it
         self.source_filenames = [
             self.project.get_relative_path(compile.attributes['Include'])
-            for compile in self.find(Compile)
+            for compile in (self.project.find(Compile)
+                            if self.project is not None else [])
             if 'Include' in compile.attributes
         ]
 
+        loader = self.loader or Loader()
         self.source = {
-            str(fn.relative_to(self.project.filename.parent)):
-            parse(fn, parent=self)
-            for fn in self.source_filenames
+            str(fn.relative_to(self.project.filename.parent)): item
+            for fn, item in zip(
+                self.source_filenames,
+                loader.parse_many(self.source_filenames, parent=self))
         }
 
         self.pou_by_name = {
@@ -747,17 +2350,24 @@ class Plc(TwincatItem):
         self.namespaces.update(self.pou_by_name)
         self.namespaces.update(self.gvl_by_name)
 
-    def find(self, cls):
-        yield from super().find(cls)
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        # Items loaded in post_init are not children, but have this parent
+        for item in (self.project, self.tmc,
+                     *getattr(self, 'source', {}).values()):
+            if item is not None:
+                item.parent = self
+
+    def _find_targets(self):
+        yield from super()._find_targets()
         if self.project is not None:
-            yield from self.project.find(cls)
+            yield self.project, False, True
 
         for key, ns in self.namespaces.items():
-            if isinstance(ns, cls):
-                yield ns
+            yield ns, True, False
 
         if self.tmc is not None:
-            yield from self.tmc.find(cls)
+            yield self.tmc, False, True
 
 
 @_register_type
@@ -778,7 +2388,7 @@ class Compile(TwincatItem):
     File to load is marked with 'Include'
     May be TcTTO, TcPOU, TcDUT, GVL, etc.
     '''
-    ...
+    __slots__ = ()
 
 
 @_register_type
@@ -915,6 +2525,23 @@ def variables_from_declaration(declaration, *, start_marker='var'):
     return variables
 
 
+_COMMENT_RE = re.compile(r'\(\*.*?\*\)|//[^\n]*', re.DOTALL)
+_CALL_START_RE = re.compile(
+    r'''
+      \(\*.*?\*\)                                # (* block comment *)
+    | //[^\n]*                                  # // line comment
+    | '(?:\$.|[^'$])*'                          # 'string'
+    | "(?:\$.|[^"$])*"                          # "wstring"
+    | ^\s*(?P<name>[A-Za-z_][A-Za-z0-9_]*)\s*\(  # name( at the start of a line
+    ''',
+    re.MULTILINE | re.DOTALL | re.VERBOSE
+)
+_CALL_END_RE = re.compile(r'\)\s*;')
+# Match two groups: (var) := (value)
+# Only works for simple variable assignments.
+_CALL_ARG_VALUE_RE = re.compile(r'([a-zA-Z0-9_]+)\s*:=\s*([a-zA-Z0-9_\.]+)')
+
+
 def get_pou_call_blocks(declaration, implementation):
     '''
     Find all call blocks given a specific POU declaration and implementation.
@@ -955,27 +2582,96 @@ def get_pou_call_blocks(declaration, implementation):
 
     '''
     variables = variables_from_declaration(declaration)
+    if not variables or implementation is None:
+        # No calls to find (e.g., no VAR block or a non-ST implementation)
+        return {}
+
     blocks = collections.defaultdict(dict)
 
-    # Match two groups: (var) := (value)
-    # Only works for simple variable assignments.
-    arg_value_re = re.compile(r'([a-zA-Z0-9_]+)\s*:=\s*([a-zA-Z0-9_\.]+)')
+    # Walk the implementation once, skipping comments and strings, looking for
+    # the start of calls: ^NAME(
+    pos = 0
+    while True:
+        match = _CALL_START_RE.search(implementation, pos)
+        if match is None:
+            break
+
+        pos = match.end()
+        name = match.group('name')
+        if name is None or name not in variables:
+            continue
+
+        # The call ends at the first: );
+        end = _CALL_END_RE.search(implementation, pos)
+        if end is None:
+            break
 
-    for var in variables:
-        # Find: ^VAR(.*);
-        reg = re.compile(r'^\s*' + var + r'\s*\(\s*((?:.*?\n?)+)\)\s*;',
-                         re.MULTILINE)
-        for match in reg.findall(implementation):
-            call_body = ' '.join(line.strip() for line in match.splitlines())
-            blocks[var].update(**dict(arg_value_re.findall(call_body)))
+        call_body = _COMMENT_RE.sub(' ', implementation[pos:end.start()])
+        blocks[name].update(**dict(_CALL_ARG_VALUE_RE.findall(call_body)))
+        pos = end.end()
 
-    return dict(blocks)
+    return {var: blocks[var] for var in variables if var in blocks}
 
 
-def load_project(fn):
+# POUs with identical code (e.g., from libraries shared between projects) are
+# only analyzed once.  Keys are the code itself, so changes to the declaration
+# or implementation text result in a new entry.
+@functools.lru_cache(maxsize=1024)
+def _cached_variables_from_declaration(declaration):
+    return variables_from_declaration(declaration)
+
+
+@functools.lru_cache(maxsize=1024)
+def _cached_pou_call_blocks(declaration, implementation):
+    return get_pou_call_blocks(declaration, implementation)
+
+
+@contextlib.contextmanager
+def _paused_gc(pause=True):
+    '''
+    Disable the cyclic garbage collector, if enabled, for the duration
+
+    Does nothing if `pause` is False.
+    '''
+    enabled = gc.isenabled() and pause
+    if enabled:
+        gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def load_project(fn, *, prefetch=False, pause_gc=True, freeze=False,
+                 **options):
     '''
     Load a tsproj file
 
+    Unless loading lazily (``lazy`` or ``defer_files``), which indexing would
+    defeat, the project is indexed for `TwincatItem.find`.
+
+    Parameters
+    ----------
+    fn : str or pathlib.Path
+        The tsproj filename
+    prefetch : bool, optional
+        Discover all files referenced by ``File`` attributes (XTI files for
+        NC, axes, IO devices, boxes, and so on) and read them concurrently
+        before building the project.
+    pause_gc : bool, optional
+        Disable the cyclic garbage collector while loading.  Every item is
+        part of a parent/child reference cycle, so otherwise the collector
+        repeatedly scans the growing model.
+    freeze : bool, optional
+        Call `gc.freeze` after loading, such that the collector ignores the
+        model (and every other object existing at that point) from then on,
+        shortening garbage collection pauses in long-running processes.  Use
+        `gc.unfreeze` to undo this.  Requires Python 3.7 or newer.
+    **options
+        Options for the `Loader`, such as ``cache_dir``, ``jobs``,
+        ``streaming``, ``keep_elements``, or ``include``.  See `Loader`.
+
     Returns
     -------
     project : Project
@@ -984,11 +2680,101 @@ def load_project(fn):
     fn = pathlib.Path(fn)
     if fn.suffix.lower() != '.tsproj':
         raise ValueError('Expected a .tsproj file')
+    if freeze and not hasattr(gc, 'freeze'):
+        raise ValueError('freeze=True requires Python 3.7 or newer')
 
-    return parse(fn)
+    loader = Loader(**options)
+    with _paused_gc(pause_gc):
+        if prefetch:
+            loader.prefetch(fn)
+        project = parse(fn, loader=loader)
+        if not loader.lazy and not loader.defer_files:
+            # Indexing would build every item
+            project.build_find_index()
+            # Anything read ahead of time but not built was skipped
+            loader._prefetched.clear()
 
+    if freeze:
+        gc.freeze()
+    logger.debug('Loaded %s: %d files parsed, %d duplicate parses avoided',
+                 fn, loader.files_parsed, loader.duplicates_avoided)
+    return project
 
-def case_insensitive_path(path):
+
+class PathResolver:
+    '''
+    Case-insensitive path matching with cached, case-folded directory
+    listings
+
+    Each directory is listed at most once, and each resolved path is
+    remembered, so repeated lookups are dictionary hits.  Changes to the
+    filesystem after a directory was listed are not seen.
+    '''
+
+    def __init__(self):
+        self._listings = {}
+        self._resolved = {}
+
+    def listing(self, directory):
+        '''
+        The case-folded listing of a directory
+
+        Returns
+        -------
+        listing : dict
+            Lowercase name to actual name.  Exact names are also included.
+        '''
+        try:
+            return self._listings[directory]
+        except KeyError:
+            ...
+
+        listing = {}
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    listing[entry.name] = entry.name
+                    listing.setdefault(entry.name.lower(), entry.name)
+        except (FileNotFoundError, NotADirectoryError):
+            ...
+        self._listings[directory] = listing
+        return listing
+
+    def resolve(self, path):
+        '''
+        Match a path in a case-insensitive manner, returning the actual
+        filename as it exists on the host machine
+
+        See `case_insensitive_path`.
+        '''
+        path = pathlib.Path(path)
+        try:
+            return self._resolved[path]
+        except KeyError:
+            ...
+
+        if path.exists():
+            self._resolved[path] = path
+            return path
+
+        new_path = pathlib.Path(path.parts[0])
+        for part in path.parts[1:]:
+            if part not in ('.', '..'):
+                listing = self.listing(new_path)
+                try:
+                    part = listing.get(part) or listing[part.lower()]
+                except KeyError:
+                    raise FileNotFoundError(
+                        f'{path} does not exist ({part!r} not in '
+                        f'{new_path!r})'
+                    ) from None
+            new_path = new_path / part
+
+        self._resolved[path] = new_path
+        return new_path
+
+
+def case_insensitive_path(path, *, resolver=None):
     '''
     Match a path in a case-insensitive manner, returning the actual filename as
     it exists on the host machine
@@ -1000,6 +2786,8 @@ def case_insensitive_path(path):
     ----------
     path : pathlib.Path or str
         The case-insensitive path
+    resolver : PathResolver, optional
+        Resolver holding cached directory listings
 
     Returns
     -------
@@ -1011,38 +2799,29 @@ def case_insensitive_path(path):
     FileNotFoundError
         When the file can't be found
     '''
-    path = pathlib.Path(path)
-    if path.exists():
-        return path
-
-    new_path = pathlib.Path(path.parts[0])
-    for part in path.parts[1:]:
-        if not (new_path / part).exists():
-            all_files = {fn.lower(): fn
-                         for fn in os.listdir(new_path)}
-            try:
-                part = all_files[part.lower()]
-            except KeyError:
-                raise FileNotFoundError(
-                    f'{path} does not exist ({part!r} not in {new_path!r})'
-                ) from None
-        new_path = new_path / part
+    if resolver is None:
+        resolver = PathResolver()
+    return resolver.resolve(path)
 
-    return new_path
 
-
-def parse(fn, *, parent=None):
+def parse(fn, *, parent=None, loader=None):
     '''
     Parse a given tsproj, xti, or tmc file.
 
+    Parameters
+    ----------
+    fn : str or pathlib.Path
+        The filename
+    parent : TwincatItem, optional
+        The parent to assign to the new item
+    loader : Loader, optional
+        Defaults to the loader of the parent, or a new `Loader` with default
+        options if unset.  Pass ``Loader(...)`` for any other options.
+
     Returns
     -------
     item : TwincatItem
     '''
-    fn = case_insensitive_path(fn)
-
-    with open(fn, 'rt') as f:
-        tree = lxml.etree.parse(f)
-
-    root = tree.getroot()
-    return TwincatItem.parse(root, filename=fn, parent=parent)
+    if loader is None:
+        loader = getattr(parent, 'loader', None) or Loader()
+    return loader.parse(fn, parent=parent)
@@ -21,7 +21,9 @@ else:
     from pytmc.xml_obj import Configuration as PytmcConfiguration
     from pytmc.bin.pytmc import process as pytmc_process, LinterError
 
-from .parse import load_project, Symbol_FB_MotionStage, Property, Project
+from .cache import default_cache_dir
+from .parse import (load_project, Compile, GVL, Link, NC, POU, Project,
+                    Property, Symbol_FB_MotionStage)
 
 
 description = __doc__
@@ -79,6 +81,24 @@ def build_arg_parser(parser=None):
         help='st.cmd Jinja2 template',
     )
 
+    parser.add_argument(
+        '--jobs', '-j', type=int, default=1,
+        help='Number of threads used to parse PLC source files'
+    )
+
+    parser.add_argument(
+        '--prefetch', action='store_true',
+        help=('Discover and read all referenced XTI files concurrently '
+              '(with --jobs threads) before building the project')
+    )
+
+    parser.add_argument(
+        '--cache-dir', type=str, nargs='?', default=None,
+        const=str(default_cache_dir()),
+        help=('Cache parsed files in this directory, re-parsing only those '
+              'that changed (default if no path is given: %(const)s)')
+    )
+
     parser.add_argument(
         '--log',
         '-l',
@@ -128,7 +148,13 @@ def render(args):
 
     template = jinja_env.get_template(args.template)
 
-    project = load_project(args.tsproj_project)
+    project = load_project(args.tsproj_project,
+                           cache_dir=args.cache_dir,
+                           jobs=args.jobs, prefetch=args.prefetch,
+                           keep_elements=False, compact_leaves=True,
+                           symbol_classes=False, parser_profile='compact',
+                           include=[Symbol_FB_MotionStage, POU, GVL, Compile,
+                                    Link, NC])
     motors = [(motor, motor.nc_axis)
               for motor in project.find(Symbol_FB_MotionStage)]
 
@@ -9,6 +9,7 @@ import logging
 import pathlib
 
 from . import parse as parse_mod
+from .cache import default_cache_dir
 
 DESCRIPTION = __doc__
 
@@ -55,6 +56,24 @@ def build_arg_parser(parser=None):
         help='Show links'
     )
 
+    parser.add_argument(
+        '--jobs', '-j', type=int, default=1,
+        help='Number of threads used to parse PLC source files'
+    )
+
+    parser.add_argument(
+        '--prefetch', action='store_true',
+        help=('Discover and read all referenced XTI files concurrently '
+              '(with --jobs threads) before building the project')
+    )
+
+    parser.add_argument(
+        '--cache-dir', type=str, nargs='?', default=None,
+        const=str(default_cache_dir()),
+        help=('Cache parsed files in this directory, re-parsing only those '
+              'that changed (default if no path is given: %(const)s)')
+    )
+
     parser.add_argument(
         '--log',
         default='INFO',
@@ -77,7 +96,32 @@ def summary(args):
     logging.basicConfig()
 
     proj_path = pathlib.Path(args.tsproj_project)
-    project = parse_mod.load_project(proj_path)
+    # Symbols are the bulk of a project; without them, build only what is
+    # used
+    lazy = not (args.all or args.symbols or args.debug)
+    if args.all or args.debug:
+        include = None
+    else:
+        # Build only what the requested sections need
+        include = []
+        if args.plcs:
+            include += [parse_mod.POU, parse_mod.GVL, parse_mod.Compile]
+        if args.symbols:
+            include.append(parse_mod.Symbol)
+        if args.nc:
+            include.append(parse_mod.NC)
+        if args.links:
+            include.append(parse_mod.Link)
+    project = parse_mod.load_project(proj_path, cache_dir=args.cache_dir,
+                                     jobs=args.jobs,
+                                     prefetch=args.prefetch,
+                                     keep_elements=args.debug,
+                                     compact_leaves=not args.debug,
+                                     symbol_classes=args.debug,
+                                     parser_profile=('default' if args.debug
+                                                     else 'compact'),
+                                     lazy=lazy, defer_files=lazy,
+                                     include=include)
 
     if args.plcs or args.all:
         for i, plc in enumerate(project.plcs, 1):
@@ -1,3 +1,11 @@
+import concurrent.futures
+import copy
+import gc
+import multiprocessing
+import pathlib
+import pickle
+import shutil
+import sys
 import pytest
 import tcparse
 import pprint
@@ -46,3 +54,435 @@ def test_fb_motionstage_linking(project):
         nc_axis = inst.nc_axis
         print('Short NC axis name', nc_axis.short_name)
         print('NC axis', nc_axis)
+
+
+def test_parse_cache(project_filename, tmp_path):
+    cold = tcparse.load_project(project_filename, cache_dir=tmp_path)
+    assert cold.loader.cache.hits == 0
+    assert list(tmp_path.glob('*.pickle'))
+
+    warm = tcparse.load_project(project_filename, cache_dir=tmp_path)
+    assert warm.loader.cache.misses == 0
+    assert warm.loader.cache.hits == cold.loader.cache.misses
+    assert repr(warm) == repr(cold)
+
+
+def test_parse_cache_relative_path(project_filename, tmp_path, monkeypatch):
+    project_filename = pathlib.Path(project_filename).absolute()
+    directory = project_filename.parent
+    monkeypatch.chdir(directory)
+    cold = tcparse.load_project(project_filename.name, cache_dir=tmp_path)
+
+    # The same files, by way of another relative path
+    monkeypatch.chdir(directory.parent)
+    warm = tcparse.load_project(
+        pathlib.Path(directory.name) / project_filename.name,
+        cache_dir=tmp_path)
+    assert warm.loader.cache.misses == 0
+    assert repr(warm) == repr(cold)
+
+
+def test_link_owner_names(project_filename, tmp_path):
+    def owners(project):
+        return [(link.a, link.b) for link in project.find(tcparse.Link)]
+
+    cold = tcparse.load_project(project_filename, cache_dir=tmp_path)
+    expected = owners(cold)
+    assert expected and all(a[0] and b[0] for a, b in expected)
+
+    warm = tcparse.load_project(project_filename, cache_dir=tmp_path)
+    assert warm.loader.cache.misses == 0
+    assert owners(warm) == expected
+
+    streamed = tcparse.load_project(project_filename, streaming=True)
+    assert owners(streamed) == expected
+
+    compact = tcparse.load_project(project_filename, compact_leaves=True)
+    assert owners(compact) == expected
+
+    lazy = tcparse.load_project(project_filename, lazy=True)
+    assert owners(lazy) == expected
+
+    deferred = tcparse.load_project(project_filename, lazy=True,
+                                    defer_files=True)
+    assert owners(deferred) == expected
+
+
+def test_parallel_source_parsing(project_filename):
+    serial = tcparse.load_project(project_filename)
+    parallel = tcparse.load_project(project_filename, jobs=4)
+    assert repr(parallel) == repr(serial)
+    for serial_plc, parallel_plc in zip(serial.plcs, parallel.plcs):
+        assert list(parallel_plc.source) == list(serial_plc.source)
+
+
+def test_prefetch(project_filename):
+    serial = tcparse.load_project(project_filename)
+    prefetched = tcparse.load_project(project_filename, jobs=4, prefetch=True)
+    assert prefetched.loader.files_prefetched > 1
+    assert repr(prefetched) == repr(serial)
+
+
+@pytest.mark.parametrize('compact_leaves', [False, True])
+def test_prefetch_cached(project_filename, tmp_path, compact_leaves):
+    tcparse.load_project(project_filename, cache_dir=tmp_path,
+                         compact_leaves=compact_leaves)
+    prefetched = tcparse.load_project(project_filename, cache_dir=tmp_path,
+                                      jobs=4, prefetch=True,
+                                      compact_leaves=compact_leaves)
+    assert prefetched.loader.files_prefetched > 1
+    assert prefetched.loader.cache.misses == 0
+
+
+@pytest.mark.parametrize(
+    'cls', [tcparse.Axis, tcparse.Link, tcparse.NC, tcparse.Plc,
+            tcparse.POU, tcparse.Property, tcparse.Symbol,
+            tcparse.Symbol_FB_MotionStage, tcparse.TcSmItem,
+            tcparse.parse.TwincatItem]
+)
+def test_find_index(project_filename, cls):
+    indexed = tcparse.load_project(project_filename)
+    unindexed = tcparse.parse.parse(project_filename)
+    assert indexed._find_index is not None
+    assert unindexed._find_index is None
+
+    def names(items):
+        return [(type(item).__name__, item.name) for item in items]
+
+    assert names(indexed.find(cls)) == names(unindexed.find(cls))
+    for plc, unindexed_plc in zip(indexed.plcs, unindexed.plcs):
+        assert names(plc.find(cls)) == names(unindexed_plc.find(cls))
+
+
+def test_fb_motionstage_pou(project):
+    for inst in project.find(tcparse.Symbol_FB_MotionStage):
+        assert isinstance(inst.pou, tcparse.POU)
+        assert inst.pou.name == inst.program_name
+        assert project.pou_by_name[inst.program_name] is inst.pou
+
+
+def test_link_index(project):
+    index = project.link_index
+    for link in project.find(tcparse.Link):
+        for side, owner_cls in (('a', tcparse.OwnerA),
+                                ('b', tcparse.OwnerB)):
+            owner = link.find_ancestor(owner_cls).name
+            variable = link.attributes[f'Var{side.upper()}']
+            assert link in index.find(variable, side=side)
+            assert link in index.find(variable, owner=owner, side=side)
+            assert link in index.find(owner=owner)
+            assert link in index.find(variable.rsplit('^')[-1].split('.')[0])
+
+
+def test_pou_cached_analysis(project):
+    for pou in project.find(tcparse.POU):
+        if pou.implementation is None:
+            continue
+        assert pou.call_blocks is pou.call_blocks
+        assert pou.variables is pou.variables
+        assert pou.call_blocks == tcparse.parse.get_pou_call_blocks(
+            pou.declaration, pou.implementation)
+
+
+def test_streaming(project_filename):
+    eager = tcparse.load_project(project_filename)
+    streamed = tcparse.load_project(project_filename, streaming=True)
+    assert repr(streamed) == repr(eager)
+    assert all(item.element is None
+               for item in streamed.find(tcparse.parse.TwincatItem))
+
+
+def test_detached_elements(project_filename):
+    eager = tcparse.load_project(project_filename)
+    detached = tcparse.load_project(project_filename, keep_elements=False)
+    assert repr(detached) == repr(eager)
+    assert all(item.element is None
+               for item in detached.find(tcparse.parse.TwincatItem))
+    assert ([link.a for link in detached.find(tcparse.Link)] ==
+            [link.a for link in eager.find(tcparse.Link)])
+
+
+@pytest.mark.parametrize('streaming', [False, True])
+def test_compact_leaves(project_filename, streaming):
+    full = tcparse.load_project(project_filename)
+    compact = tcparse.load_project(project_filename, streaming=streaming,
+                                   compact_leaves=True)
+    assert repr(compact) == repr(full)
+    assert (list(compact.find(tcparse.parse.TwincatLeaf)) and
+            not list(full.find(tcparse.parse.TwincatLeaf)))
+    assert ([symbol.info for symbol in compact.find(tcparse.Symbol)] ==
+            [symbol.info for symbol in full.find(tcparse.Symbol)])
+
+
+def test_compact_leaves_cache(project_filename, tmp_path):
+    full = tcparse.load_project(project_filename)
+    for _ in range(2):
+        compact = tcparse.load_project(project_filename, cache_dir=tmp_path,
+                                       compact_leaves=True)
+        assert repr(compact) == repr(full)
+    assert list(compact.find(tcparse.parse.TwincatLeaf))
+
+    cached = tcparse.load_project(project_filename, cache_dir=tmp_path)
+    assert not list(cached.find(tcparse.parse.TwincatLeaf))
+
+
+def test_lazy(project_filename):
+    eager = tcparse.load_project(project_filename)
+    lazy = tcparse.load_project(project_filename, lazy=True)
+    tmc = lazy.plcs[0].tmc
+    assert tmc._pending is not None
+
+    for cls in (tcparse.NC, tcparse.Axis, tcparse.Link):
+        assert ([item.name for item in lazy.find(cls)] ==
+                [item.name for item in eager.find(cls)])
+    # Nothing to find in the TMC file
+    assert tmc._pending is not None
+
+    assert repr(lazy) == repr(eager)
+    assert repr(tmc) == repr(eager.plcs[0].tmc)
+    assert tmc._pending is None
+
+
+@pytest.mark.parametrize('streaming', [False, True])
+def test_shared_symbol_class(project_filename, streaming):
+    full = tcparse.load_project(project_filename)
+    shared = tcparse.load_project(project_filename, streaming=streaming,
+                                  symbol_classes=False)
+    symbols = list(shared.find(tcparse.Symbol))
+    assert ([symbol.info for symbol in symbols] ==
+            [symbol.info for symbol in full.find(tcparse.Symbol)])
+    assert {type(symbol) for symbol in symbols} <= {
+        tcparse.Symbol, tcparse.Symbol_FB_MotionStage}
+    assert (list(shared.find(tcparse.Symbol_FB_MotionStage)) ==
+            shared.symbols_by_type.get('FB_MotionStage', []))
+    assert ({key: [symbol.name for symbol in value]
+             for key, value in shared.symbols_by_type.items()} ==
+            {key: [symbol.name for symbol in value]
+             for key, value in full.symbols_by_type.items()})
+
+
+def test_load_gc(project_filename):
+    assert gc.isenabled()
+    tcparse.load_project(project_filename)
+    assert gc.isenabled()
+
+    gc.disable()
+    try:
+        tcparse.load_project(project_filename)
+        assert not gc.isenabled()
+    finally:
+        gc.enable()
+
+    tcparse.load_project(project_filename, pause_gc=False)
+    assert gc.isenabled()
+
+
+@pytest.mark.skipif(sys.version_info < (3, 7),
+                    reason='gc.freeze requires Python 3.7')
+def test_load_gc_freeze(project_filename):
+    try:
+        project = tcparse.load_project(project_filename, freeze=True)
+        assert gc.get_freeze_count() > 0
+        # Frozen objects are no longer in any generation
+        assert all(obj is not project for obj in gc.get_objects())
+    finally:
+        gc.unfreeze()
+
+
+@pytest.mark.parametrize('streaming', [False, True])
+@pytest.mark.parametrize('profile', ['safe', 'compact', 'huge'])
+def test_parser_profile(project_filename, profile, streaming):
+    default = tcparse.load_project(project_filename)
+    project = tcparse.load_project(project_filename, streaming=streaming,
+                                   parser_profile=profile)
+    assert repr(project) == repr(default)
+    items = list(project.find(tcparse.parse.TwincatItem))
+    if profile == 'safe':
+        assert (sum(len(item.comments) for item in items) ==
+                sum(len(item.comments)
+                    for item in default.find(tcparse.parse.TwincatItem)))
+    else:
+        assert not any(item.comments for item in items)
+
+
+@pytest.mark.parametrize('lazy', [False, True])
+def test_include(project_filename, lazy):
+    full = tcparse.load_project(project_filename, lazy=lazy)
+
+    nc = tcparse.load_project(project_filename, lazy=lazy,
+                              include=[tcparse.NC])
+    assert ([dict(axis.summarize()) for axis in nc.find(tcparse.Axis)] ==
+            [dict(axis.summarize()) for axis in full.find(tcparse.Axis)])
+    assert not list(nc.find(tcparse.Symbol))
+    assert not list(nc.find(tcparse.Link))
+    list(full.find(tcparse.Symbol))
+    assert nc.loader.files_parsed < full.loader.files_parsed
+
+    links = tcparse.load_project(project_filename, lazy=lazy,
+                                 include=[tcparse.Link])
+    assert ([(link.a, link.b) for link in links.find(tcparse.Link)] ==
+            [(link.a, link.b) for link in full.find(tcparse.Link)])
+    assert not list(links.find(tcparse.Axis))
+
+    motors = tcparse.load_project(
+        project_filename, lazy=lazy,
+        include=[tcparse.Symbol_FB_MotionStage, tcparse.POU, tcparse.GVL,
+                 tcparse.Compile, tcparse.Link, tcparse.NC])
+    assert ([(motor.nc_axis.name, motor.module.ads_port)
+             for motor in motors.find(tcparse.Symbol_FB_MotionStage)] ==
+            [(motor.nc_axis.name, motor.module.ads_port)
+             for motor in full.find(tcparse.Symbol_FB_MotionStage)])
+
+
+def test_include_cache(project_filename, tmp_path):
+    full = tcparse.load_project(project_filename)
+    for _ in range(2):
+        nc = tcparse.load_project(project_filename, cache_dir=tmp_path,
+                                  include=[tcparse.NC])
+        assert not list(nc.find(tcparse.Symbol))
+
+    cached = tcparse.load_project(project_filename, cache_dir=tmp_path)
+    assert repr(cached) == repr(full)
+
+
+def test_include_cache_streaming(project_filename, tmp_path):
+    # Not projected, so shared with the full project in the cache
+    tcparse.load_project(project_filename, cache_dir=tmp_path,
+                         streaming=True)
+    streamed = tcparse.load_project(project_filename, cache_dir=tmp_path,
+                                    streaming=True, include=[tcparse.NC])
+    assert streamed.loader.cache.misses == 0
+    assert list(streamed.find(tcparse.Symbol))
+
+
+def test_include_cache_referenced_files(project_filename, tmp_path):
+    project_path = pathlib.Path(project_filename)
+    root = tmp_path / 'project'
+    shutil.copytree(project_path.parent, root)
+    project_filename = root / project_path.name
+
+    device_path = root / '_Config' / 'IO' / 'Device 1 (EtherCAT).xti'
+    device = device_path.read_text()
+    box, = [line for line in device.splitlines(keepends=True)
+            if '<Box File=' in line]
+    device_path.write_text(device.replace(box, ''))
+    cache_dir = tmp_path / 'cache'
+    project = tcparse.load_project(project_filename, cache_dir=cache_dir,
+                                   include=[tcparse.Box])
+    assert not list(project.find(tcparse.Box))
+
+    # Only the referenced file changes
+    device_path.write_text(device)
+    project = tcparse.load_project(project_filename, cache_dir=cache_dir,
+                                   include=[tcparse.Box])
+    uncached = tcparse.load_project(project_filename, include=[tcparse.Box])
+    assert len(list(project.find(tcparse.Box))) == len(
+        list(uncached.find(tcparse.Box))) > 0
+
+
+def test_exclude(project_filename):
+    full = tcparse.load_project(project_filename)
+    project = tcparse.load_project(project_filename,
+                                   exclude=[tcparse.Box])
+    assert list(full.find(tcparse.Box))
+    assert not list(project.find(tcparse.Box))
+    assert ([item.name for item in project.find(tcparse.Device)] ==
+            [item.name for item in full.find(tcparse.Device)])
+    assert project.loader.files_parsed < full.loader.files_parsed
+
+
+@pytest.mark.parametrize('lazy', [False, True])
+def test_defer_files(project_filename, lazy):
+    full = tcparse.load_project(project_filename)
+    deferred = tcparse.load_project(project_filename, lazy=lazy,
+                                    defer_files=True)
+    loader = deferred.loader
+    assert loader.files_parsed < full.loader.files_parsed
+
+    nc, = deferred.find(tcparse.NC)
+    assert [axis.name for axis in nc.axes] == [
+        axis.name for axis in full.find(tcparse.Axis)]
+    assert loader.files_deferred > 0
+
+    assert repr(deferred) == repr(full)
+    assert repr(deferred.plcs[0].tmc) == repr(full.plcs[0].tmc)
+    assert loader.files_parsed == full.loader.files_parsed
+
+
+def test_defer_files_find_again(project_filename):
+    project = tcparse.load_project(project_filename, defer_files=True)
+    loader = project.loader
+    read = []
+
+    def counted_read(fn):
+        read.append(fn)
+        return type(loader)._read(loader, fn)
+
+    loader._read = counted_read
+    nc, = project.find(tcparse.NC)
+    assert read
+    # Files which were found not to include any NC are not read again
+    read.clear()
+    assert list(project.find(tcparse.NC)) == [nc]
+    assert not read
+
+
+@pytest.mark.parametrize('lazy', [False, True])
+def test_pickle(project_filename, lazy):
+    project = tcparse.load_project(project_filename, lazy=lazy)
+    unpickled = pickle.loads(pickle.dumps(project))
+    assert unpickled.parent is None and unpickled.loader is None
+    assert repr(unpickled) == repr(project)
+    assert ([symbol.info for symbol in unpickled.find(tcparse.Symbol)] ==
+            [symbol.info for symbol in project.find(tcparse.Symbol)])
+    assert ([motor.nc_axis.name
+             for motor in unpickled.find(tcparse.Symbol_FB_MotionStage)] ==
+            [motor.nc_axis.name
+             for motor in project.find(tcparse.Symbol_FB_MotionStage)])
+
+
+def _summarize_axis(axis):
+    return axis.parent, dict(axis.summarize())
+
+
+def _symbol_types(symbols):
+    return [(type(symbol).__name__, symbol.base_type) for symbol in symbols]
+
+
+@pytest.mark.skipif(sys.version_info < (3, 7),
+                    reason='ProcessPoolExecutor(mp_context=...) requires '
+                    'Python 3.7')
+def test_pickle_process_pool(project_filename):
+    project = tcparse.load_project(project_filename, keep_elements=False,
+                                   compact_leaves=True)
+    axes = list(project.find(tcparse.Axis))
+    symbols = list(project.find(tcparse.Symbol))
+
+    # New processes have none of the generated classes (e.g., Symbol_BOOL)
+    context = multiprocessing.get_context('spawn')
+    with concurrent.futures.ProcessPoolExecutor(
+            2, mp_context=context) as pool:
+        summaries = list(pool.map(_summarize_axis, axes))
+        symbol_types = pool.submit(_symbol_types, symbols).result()
+
+    assert summaries == [(None, dict(axis.summarize())) for axis in axes]
+    assert symbol_types == _symbol_types(symbols)
+
+
+def test_copy(project_filename):
+    project = tcparse.load_project(project_filename)
+    original = project.Project[0]
+    children = list(original.children)
+    plc = project.plcs[0]
+
+    shallow = copy.copy(original)
+    assert shallow.children == children and shallow.parent is project
+    assert all(child.parent is original for child in children)
+    copy.copy(plc)
+    assert plc.tmc.parent is plc and plc.project.parent is plc
+
+    deep = copy.deepcopy(original)
+    assert repr(deep) == repr(original)
+    assert all(child.parent is deep for child in deep.children)
+    assert all(child.parent is original for child in children)
+    assert plc.tmc.parent is plc
@@ -1,7 +1,13 @@
+import shutil
+import sys
+
+import lxml.etree
 import pytest
 from .conftest import TEST_ROOT
 
-from ..parse import get_pou_call_blocks, variables_from_declaration, parse
+from ..parse import (get_pou_call_blocks, variables_from_declaration, parse,
+                     Box, Loader, LinkIndex, PathResolver, Symbol,
+                     TwincatItem, TWINCAT_TYPES, case_insensitive_path)
 
 
 @pytest.mark.parametrize(
@@ -165,6 +171,45 @@ def test_call_blocks():
     }
 
 
+def test_call_blocks_comments_and_strings():
+    decl = '''
+        PROGRAM Main
+        VAR
+                M1: FB_DriveVirtual;
+                M2: FB_DriveVirtual;
+                sMsg: STRING;
+        END_VAR
+    '''
+
+    impl = '''
+        (*
+        M2(En := TRUE);
+        *)
+        // M2(bEnable := TRUE);
+        sMsg := 'M2(En := TRUE);';
+        M1(En := TRUE, (* bEnable := TRUE, *)
+           Axis := M1Link.axis  // the axis
+           );
+    '''
+
+    assert get_pou_call_blocks(decl, impl) == {
+        'M1': {'En': 'TRUE', 'Axis': 'M1Link.axis'},
+    }
+
+
+def test_call_blocks_without_calls():
+    decl = '''
+        PROGRAM Main
+        VAR
+                M1: FB_DriveVirtual;
+        END_VAR
+    '''
+    # No VAR block, or no structured text implementation
+    assert get_pou_call_blocks('PROGRAM Main', None) == {}
+    assert get_pou_call_blocks('PROGRAM Main', 'M1(En := TRUE);') == {}
+    assert get_pou_call_blocks(decl, None) == {}
+
+
 def test_route_parsing():
     # located in: C:\twincat\3.1\StaticRoutes.xml
     routes = parse(TEST_ROOT / 'static_routes.xml')
@@ -209,3 +254,204 @@ def test_route_parsing():
             'Type': 'TCP_IP'
         },
     }
+
+
+def test_parse_cache_invalidation(tmp_path):
+    fn = tmp_path / 'static_routes.xml'
+    shutil.copy(TEST_ROOT / 'static_routes.xml', fn)
+    cache_dir = tmp_path / 'cache'
+
+    def parse_cached():
+        loader = Loader(cache_dir=cache_dir)
+        item = parse(fn, loader=loader)
+        return item, (loader.cache.hits, loader.cache.misses)
+
+    cold, stats = parse_cached()
+    assert stats == (0, 1)
+    warm, stats = parse_cached()
+    assert stats == (1, 0)
+    assert (warm.RemoteConnections[0].by_name ==
+            cold.RemoteConnections[0].by_name)
+
+    fn.write_text(fn.read_text().replace('LAMP-VACUUM', 'LAMP-VAC'))
+    modified, stats = parse_cached()
+    assert stats == (0, 1)
+    assert 'LAMP-VAC' in modified.RemoteConnections[0].by_name
+
+
+def test_route_parsing_streaming():
+    routes = parse(TEST_ROOT / 'static_routes.xml')
+    streamed = parse(TEST_ROOT / 'static_routes.xml',
+                     loader=Loader(streaming=True))
+    assert repr(streamed) == repr(routes)
+    assert (streamed.RemoteConnections[0].by_name ==
+            routes.RemoteConnections[0].by_name)
+
+
+@pytest.mark.parametrize('streaming', [False, True])
+def test_symbol_subclass_with_state(tmp_path, monkeypatch, streaming):
+    class Symbol_ST_Stateful(Symbol):
+        # Not slotted, so not compatible with the layout of Symbol
+        def post_init(self):
+            self.size = int(self.BitSize[0].text)
+
+    monkeypatch.setitem(TWINCAT_TYPES, 'Symbol_ST_Stateful',
+                        Symbol_ST_Stateful)
+    fn = tmp_path / 'symbols.tmc'
+    fn.write_text(
+        '<DataAreas><DataArea>'
+        '<Symbol><Name>MAIN.stState</Name><BaseType>ST_Stateful</BaseType>'
+        '<BitSize>16</BitSize></Symbol>'
+        '</DataArea></DataAreas>')
+
+    area = parse(fn, loader=Loader(streaming=streaming))
+    symbol, = area.DataArea[0].Symbol
+    assert type(symbol) is Symbol_ST_Stateful
+    assert symbol.name == 'MAIN.stState' and symbol.size == 16
+    assert all(child.parent is symbol for child in symbol.children)
+
+
+def test_compact_items():
+    routes = parse(TEST_ROOT / 'static_routes.xml')
+    route = routes.RemoteConnections[0].Route[0]
+    assert not hasattr(route, '__dict__')
+    assert route.Name[0].text == 'LAMP-VACUUM'
+    assert route.children_by_tag.Address == route.Address
+    assert route.Name[0].children is route.Address[0].children
+    with pytest.raises(AttributeError):
+        route.Missing
+    with pytest.raises(AttributeError):
+        route.Name[0].Name
+
+
+def test_property_attribute_error():
+    root = lxml.etree.fromstring(
+        '<Symbol><Name>MAIN.bFlag</Name><BaseType>BOOL</BaseType></Symbol>')
+    symbol = TwincatItem.parse(root, loader=Loader())
+    # The missing tag is reported, rather than the property itself
+    with pytest.raises(AttributeError, match='BitSize'):
+        symbol.info
+
+
+def test_walk_pruning():
+    routes = parse(TEST_ROOT / 'static_routes.xml')
+    assert ([item.tag for item in routes.walk()] ==
+            ['RemoteConnections'] +
+            ['Route', 'Name', 'Address', 'NetId', 'Type'] * 2)
+    assert ([item.tag for item in routes.walk(
+        prune=lambda item: item.tag == 'Route')] ==
+        ['RemoteConnections', 'Route', 'Route'])
+
+
+def test_deep_tree():
+    depth = 5 * sys.getrecursionlimit()
+    root = element = lxml.etree.Element('Root')
+    for _ in range(depth):
+        element = lxml.etree.SubElement(element, 'Nested')
+    lxml.etree.SubElement(element, 'Name').text = 'innermost'
+
+    item = TwincatItem.parse(root, loader=Loader())
+    assert len(list(item.walk())) == depth + 1
+    innermost, = [nested for nested in item.find(TwincatItem)
+                  if nested.name == 'innermost']
+    item.build_find_index()
+    assert innermost in item.find(TwincatItem)
+
+
+def test_deep_file(tmp_path):
+    # Deeper than the recursion limit, but within the limit of libxml2 (even
+    # with huge_tree)
+    depth = 2000
+    assert depth > sys.getrecursionlimit()
+    fn = tmp_path / 'deep.xml'
+    fn.write_text('<Root>' + '<Nested>' * depth + '<Box File="box.xti"/>' +
+                  '</Nested>' * depth + '</Root>')
+    (tmp_path / 'deep').mkdir()
+    (tmp_path / 'deep' / 'box.xti').write_text(
+        '<Box><Name>innermost</Name></Box>')
+
+    cache_dir = tmp_path / 'cache'
+    for cache_dir, prefetch in [(None, True), (cache_dir, False),
+                                (cache_dir, True)]:
+        loader = Loader(cache_dir=cache_dir, parser_profile='huge')
+        if prefetch:
+            loader.prefetch(fn)
+            assert loader.files_prefetched == 2
+        item = parse(fn, loader=loader)
+        assert len(list(item.walk())) == depth + 2
+        box, = item.find(Box)
+        assert box.name == 'innermost'
+
+    # Both files were cached, then loaded from the cache
+    assert loader.cache.misses == 0
+
+
+@pytest.mark.parametrize('intern_strings', [False, True])
+def test_interned_strings(intern_strings):
+    routes = parse(TEST_ROOT / 'static_routes.xml',
+                   loader=Loader(intern_strings=intern_strings))
+    first, second = routes.RemoteConnections[0].Route
+    assert first.Type[0].text == second.Type[0].text == 'TCP_IP'
+    assert (first.Type[0].text is second.Type[0].text) == intern_strings
+    assert (first.tag is second.tag) == intern_strings
+
+
+def test_parser_profile_huge_tree(tmp_path):
+    depth = 1000
+    fn = tmp_path / 'deep.xml'
+    fn.write_text('<Root>' + '<Nested>' * depth + '</Nested>' * depth +
+                  '</Root>')
+    with pytest.raises(lxml.etree.XMLSyntaxError):
+        parse(fn)
+
+    for streaming in (False, True):
+        loader = Loader(parser_profile='huge', streaming=streaming)
+        assert len(list(parse(fn, loader=loader).walk())) == depth
+
+
+def test_parse_identity_map():
+    loader = Loader()
+    routes = parse(TEST_ROOT / 'static_routes.xml', loader=loader)
+    assert parse(TEST_ROOT / 'static_routes.xml', loader=loader) is routes
+    assert loader.files_parsed == 1
+    assert loader.duplicates_avoided == 1
+
+
+def test_link_index_prefixes():
+    class FakeLink:
+        def __init__(self, var_a, var_b):
+            self.attributes = {'VarA': var_a, 'VarB': var_b}
+
+        def find_ancestor(self, cls):
+            ...
+
+    m1 = FakeLink('PlcTask Inputs^MAIN.M1.Axis.NcToPlc', 'Out^NcToPlc')
+    m10 = FakeLink('PlcTask Inputs^MAIN.M10.Axis.NcToPlc', 'Out^NcToPlc')
+    index = LinkIndex([m1, m10])
+    assert index.find('Main.M1') == [m1]
+    assert index.find('MAIN.M1', side='b') == []
+    assert index.find('main') == [m1, m10]
+    assert index.find('NcToPlc', side='b') == [m1, m10]
+
+
+def test_case_insensitive_path(tmp_path):
+    fn = tmp_path / 'SubDir' / 'File.XTI'
+    fn.parent.mkdir()
+    fn.write_text('')
+
+    resolver = PathResolver()
+    for requested in [tmp_path / 'subdir' / 'file.xti',
+                      tmp_path / 'SUBDIR' / '..' / 'SubDir' / 'FILE.xti',
+                      fn]:
+        assert case_insensitive_path(requested).resolve() == fn.resolve()
+        assert resolver.resolve(requested).resolve() == fn.resolve()
+
+    with pytest.raises(FileNotFoundError):
+        case_insensitive_path(tmp_path / 'subdir' / 'missing.xti')
+
+    # Directory listings and results are cached
+    (tmp_path / 'SubDir' / 'Other.xti').write_text('')
+    with pytest.raises(FileNotFoundError):
+        resolver.resolve(tmp_path / 'subdir' / 'other.xti')
+    assert resolver.resolve(tmp_path / 'subdir' / 'file.xti').name == \
+        'File.XTI'